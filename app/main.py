@@ -1,7 +1,9 @@
 # app/main.py
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import os
+import asyncio
 import shutil
 import openai
 from dotenv import load_dotenv
@@ -14,11 +16,47 @@ openai.api_key = os.getenv("OPENAI_API_KEY")
 if not openai.api_key:
     print("Warning: OPENAI_API_KEY environment variable is not set. API calls will fail.")
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    from app.routers.audio import TEMP_AUDIO_DIR, static_prompts
+    from app.utils.audio_prep import shutdown_pool
+    from app.utils.janitor import run_janitor, sweep_orphans
+    from app.utils.tts import TTS_DIR, TTS_PREWARM, prewarm
+    from app.utils.whisper_stt import STT_BACKEND
+
+    # Uploads left behind by a previous process that died mid-request
+    removed, reclaimed = await asyncio.to_thread(sweep_orphans, TEMP_AUDIO_DIR)
+    if removed:
+        print(f"Removed {removed} orphaned uploads ({reclaimed} bytes)")
+    janitor_task = asyncio.create_task(run_janitor([TTS_DIR, TEMP_AUDIO_DIR]))
+
+    # Load the on-box Whisper model in its workers before the first turn arrives
+    if STT_BACKEND == "local":
+        from app.utils.local_whisper import start_local_whisper
+
+        await asyncio.to_thread(start_local_whisper)
+
+    # Pre-render constant prompts so greetings and re-asks are served from memory
+    if TTS_PREWARM:
+        report = await prewarm(static_prompts())
+        print(f"TTS warm-up: {report['ok']}/{report['prompts']} prompts in {report['seconds']}s")
+        for text, err in report["failed"].items():
+            print(f"TTS warm-up failed for {text!r}: {err}")
+    yield
+
+    janitor_task.cancel()
+    shutdown_pool()
+    if STT_BACKEND == "local":
+        from app.utils.local_whisper import stop_local_whisper
+
+        stop_local_whisper()
+
 # Create the FastAPI app instance
 app = FastAPI(
     title="Automated Appointment Agent",
     description="An automated patient appointment booking system using OpenAI's chained architecture.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Set up CORS middleware
@@ -38,3 +76,40 @@ app.include_router(audio_router)
 @app.get("/")
 async def root():
     return {"message": "Hello, world! FastAPI server is running."}
+
+@app.get("/metrics")
+async def metrics():
+    from app.routers.audio import speculation_stats, stream_stats, stt_hint_stats
+    from app.utils.admission import admission_snapshot
+    from app.utils.audio_prep import normalize_stats, vad_stats
+    from app.utils.janitor import janitor_stats
+    from app.utils.local_whisper import local_stt_snapshot
+    from app.utils.nlp import extraction_snapshot
+    from app.utils.openai_client import connection_snapshot
+    from app.utils.tts import clip_stats, failover_stats, pool_snapshot, prewarm_report, singleflight_stats
+    from app.utils.tts_cache import tts_cache
+    from app.utils.whisper_stt import hedge_snapshot
+
+    return {
+        "admission": admission_snapshot(),
+        "janitor": janitor_stats,
+        "stt_vad": vad_stats,
+        "stt_normalize": normalize_stats,
+        "stt_local": local_stt_snapshot(),
+        "stt_stream": stream_stats,
+        "stt_hints": stt_hint_stats,
+        "stt_hedging": hedge_snapshot(),
+        "nlp_extraction": extraction_snapshot(),
+        "openai_http": connection_snapshot(),
+        "tts_cache": tts_cache.snapshot(),
+        "tts_prewarm": prewarm_report,
+        "tts_singleflight": singleflight_stats,
+        "tts_pool": pool_snapshot(),
+        "tts_failover": failover_stats,
+        "tts_readback_clips": clip_stats,
+        "tts_speculation": {
+            **speculation_stats,
+            "hit_rate": round(speculation_stats["hits"] / speculation_stats["launched"], 4) if speculation_stats["launched"] else None,
+            "seconds_saved_per_turn": round(speculation_stats["seconds_saved"] / speculation_stats["turns"], 4) if speculation_stats["turns"] else None,
+        },
+    }
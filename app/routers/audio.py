@@ -1,18 +1,40 @@
 # app/routers/audio.py
 import os
-import shutil
+import copy
+import json
+import time
 import re
+import string
+import asyncio
 import datetime
+import weakref
 from urllib.parse import quote
 
-from fastapi import APIRouter, UploadFile, File, HTTPException, Form
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Header, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response, StreamingResponse
 
 from app.utils.calendar import create_google_calendar_event, get_google_calendar_service
-from app.utils.tts import speak_text
-from app.utils.whisper_stt import transcribe_with_openai
+from app.utils.tts import (
+    TTS_FORMATS,
+    TTS_READBACK_CLIPS,
+    TTS_SEGMENTED,
+    TTSUnavailable,
+    cached_speech,
+    is_cached,
+    negotiate_format,
+    resident_speech,
+    should_stream,
+    speak_bytes,
+    speak_clips,
+    stream_speech,
+)
+from app.utils.admission import ADMISSION_HOLD_AUDIO, Overloaded, enter_turn, leave_turn, stage
+from app.utils.audio_prep import Endpointer, pcm_to_wav, prepare_async
+from app.utils.whisper_stt import STT_BACKEND, STTTimeout, transcribe_async
 from app.utils.nlp import (
+    EXTRACT_OPPORTUNISTIC,
     extract_fields_with_llm,
+    extract_fields_with_rules,
     is_affirmative,
     is_negative,
     is_filler,
@@ -23,6 +45,7 @@ router = APIRouter(prefix="/audio", tags=["audio"])
 conversation_states: dict[str, dict] = {}
 
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+# Uploads are no longer copied here; the janitor still clears files left by older versions
 TEMP_AUDIO_DIR = os.path.join(BASE_DIR, "routers", "temp_audio")
 os.makedirs(TEMP_AUDIO_DIR, exist_ok=True)
 
@@ -53,11 +76,13 @@ _COMMON_PROVIDERS = {
     "gmail", "outlook", "hotmail", "protonmail", "icloud", "yahoo",
     "aol", "zoho", "yandex", "gmx", "hey", "live", "msn", "me"
 }
-def _speakable_email(email: str) -> str:
+_COMMON_TLDS = {"com", "co", "uk", "org", "net", "io", "edu", "gov", "ac", "info", "us", "ca"}
+
+def _email_tokens(email: str) -> list[str] | None:
     try:
         local, domain = email.split("@", 1)
     except ValueError:
-        return email
+        return None
     local_tokens = []
     for ch in local:
         if ch == ".": local_tokens.append("dot")
@@ -75,21 +100,69 @@ def _speakable_email(email: str) -> str:
             domain_tokens.append("dash" if ch == "-" else ch)
     for tld in rest:
         domain_tokens.append("dot"); domain_tokens.append(tld.lower())
-    return ",  ".join(local_tokens + ["at"] + domain_tokens)
+    return local_tokens + ["at"] + domain_tokens
 
-def _friendly_datetime(date_iso: str, time_24: str | None) -> str:
+def _speakable_email(email: str) -> str:
+    tokens = _email_tokens(email)
+    return ",  ".join(tokens) if tokens is not None else email
+
+def _spoken_time(hour: int, minute: int) -> str:
+    ampm = "am" if hour < 12 else "pm"
+    h12 = hour % 12 or 12
+    return f"{h12}{'' if minute==0 else ':'+str(minute).zfill(2)} {ampm}"
+
+def _datetime_tokens(date_iso: str, time_24: str | None) -> list[str]:
     y, m, d = [int(x) for x in date_iso.split("-")]
     hour = minute = 0
     if time_24:
         hour, minute = [int(x) for x in time_24.split(":")]
     dt = datetime.datetime(y, m, d, hour, minute)
-    weekday = dt.strftime("%A"); month = dt.strftime("%B"); day = dt.day
+    tokens = [dt.strftime("%A"), str(dt.day), dt.strftime("%B")]
     if time_24:
-        ampm = "am" if hour < 12 else "pm"
-        h12 = hour % 12 or 12
-        time_part = f"{h12}{'' if minute==0 else ':'+str(minute).zfill(2)} {ampm}"
-        return f"{weekday} {day} {month} at {time_part}"
-    return f"{weekday} {day} {month}"
+        tokens += ["at", _spoken_time(hour, minute)]
+    return tokens
+
+def _friendly_datetime(date_iso: str, time_24: str | None) -> str:
+    return " ".join(_datetime_tokens(date_iso, time_24))
+
+# Read-backs spliced from pre-rendered clips (TTS_READBACK_CLIPS=1)
+READBACK_LEAD = "I heard"
+
+def _clip_text(token: str) -> str:
+    # Upper-case single letters so TTS says the letter name ('A'), not the article
+    return token.upper() if len(token) == 1 and token.isalpha() else token
+
+def readback_clip_library() -> list[str]:
+    """
+    Every clip an email or date/time read-back is built from: letters, digits,
+    symbols, common providers and TLDs, weekdays, months, days of the month and
+    quarter-hour clock times. Anything else is synthesized once and cached.
+    """
+    clips = [READBACK_LEAD, PROMPT_IS_CORRECT, "at", "dot", "dash", "underscore"]
+    clips += [_clip_text(ch) for ch in string.ascii_lowercase] + list(string.digits)
+    clips += sorted(_COMMON_PROVIDERS) + sorted(_COMMON_TLDS)
+    clips += [datetime.date(2024, 1, i).strftime("%A") for i in range(1, 8)]  # 2024-01-01 is a Monday
+    clips += [datetime.date(2024, m, 1).strftime("%B") for m in range(1, 13)]
+    clips += [str(d) for d in range(1, 32)]
+    clips += [_spoken_time(h, mm) for h in range(24) for mm in (0, 15, 30, 45)]
+    return list(dict.fromkeys(clips))
+
+def _readback_clips(state: dict, response_text: str) -> list[str] | None:
+    """
+    Clip sequence for this turn's read-back, or None if the turn isn't one.
+    """
+    if not response_text.startswith(READBACK_LEAD):
+        return None
+    c = state["captured"]
+    if state["step"] == "confirm_email" and c["patient_email"]:
+        tokens = _email_tokens(c["patient_email"])
+    elif state["step"] == "confirm_datetime" and c["appointment_date"]:
+        tokens = _datetime_tokens(c["appointment_date"], c["appointment_time"])
+    else:
+        return None
+    if tokens is None:
+        return None
+    return [READBACK_LEAD] + [_clip_text(t) for t in tokens] + [PROMPT_IS_CORRECT]
 
 def _date_examples() -> str:
     """
@@ -108,171 +181,413 @@ def _date_examples() -> str:
     abs_date = today + datetime.timedelta(days=14)
     return f"'{this_friday.strftime('%A') if this_friday!=today else 'today'} {this_friday.day} {this_friday.strftime('%B')}', 'next Monday', '{abs_date.day} {abs_date.strftime('%B')}'"
 
+# Constant utterances (pre-rendered at startup, see static_prompts)
+PROMPT_GREETING = "Hello! I can help you book an appointment. Could I take your full name, please?"
+PROMPT_ASK_NAME = "Could I take your full name, please?"
+PROMPT_ASK_EMAIL = "Thanks. What is your email address?"
+PROMPT_ASK_TIME = "What time would you prefer? You can say '2 pm' or '14:30'."
+PROMPT_ASK_REASON = "Finally, what is the reason for your visit?"
+PROMPT_BOOKED = "Your appointment is booked. You’ll receive a confirmation by email shortly. Anything else I can help with?"
+PROMPT_BOOKING_FAILED = "I couldn't complete the booking just now. Would you like me to try again?"
+PROMPT_HOLD = "Sorry, I'm a little busy right now. Please hold on a moment."
+# Fixed sentences around the variable read-backs (cached segments when TTS_SEGMENTED=1)
+PROMPT_IS_CORRECT = "Is that correct?"
+PROMPT_CONFIRM_OPENER = "Perfect."
+PROMPT_CONFIRM_TAIL = "Shall I book this now?"
+
+def _ask_date_prompt() -> str:
+    return f"Great. What date would you like? You can say {_date_examples()}."
+
+def static_prompts() -> list[str]:
+    """
+    Every utterance the state machine can emit without user-specific slots.
+    The date prompt embeds today's examples, so it is valid for the current day.
+    """
+    prompts = [
+        PROMPT_GREETING,
+        PROMPT_ASK_NAME,
+        PROMPT_ASK_EMAIL,
+        _ask_date_prompt(),
+        PROMPT_ASK_TIME,
+        PROMPT_ASK_REASON,
+        PROMPT_BOOKED,
+        PROMPT_BOOKING_FAILED,
+    ]
+    if TTS_SEGMENTED:
+        prompts += [PROMPT_IS_CORRECT, PROMPT_CONFIRM_OPENER, PROMPT_CONFIRM_TAIL]
+    if TTS_READBACK_CLIPS:
+        prompts += readback_clip_library()
+    if ADMISSION_HOLD_AUDIO:
+        prompts.append(PROMPT_HOLD)
+    return prompts
+
 def _next_prompt(state: dict) -> str:
     c = state["captured"]
 
     if state["step"] == "greeting":
         state["step"] = "ask_name"
-        return "Hello! I can help you book an appointment. Could I take your full name, please?"
+        return PROMPT_GREETING
 
     if state["step"] == "ask_name":
         if not c["patient_name"]:
-            return "Could I take your full name, please?"
+            return PROMPT_ASK_NAME
         state["step"] = "ask_email"
 
     if state["step"] in ("ask_email", "confirm_email"):
         if not c["patient_email"]:
             state["step"] = "ask_email"
-            return "Thanks. What is your email address?"
+            return PROMPT_ASK_EMAIL
         if not state.get("email_confirmed"):
             state["step"] = "confirm_email"
             spelled = _speakable_email(c["patient_email"])
-            return f"I heard {spelled}. Is that correct?"
+            return f"{READBACK_LEAD} {spelled}. {PROMPT_IS_CORRECT}"
         state["step"] = "ask_date"
 
     if state["step"] in ("ask_date", "ask_time", "confirm_datetime"):
         if not c["appointment_date"] and not c["appointment_time"]:
             state["step"] = "ask_date"
-            examples = _date_examples()
-            return f"Great. What date would you like? You can say {examples}."
+            return _ask_date_prompt()
         if c["appointment_date"] and not c["appointment_time"]:
             state["step"] = "ask_time"
-            return "What time would you prefer? You can say '2 pm' or '14:30'."
+            return PROMPT_ASK_TIME
         if c["appointment_date"] and c["appointment_time"] and not state.get("datetime_confirmed"):
             state["step"] = "confirm_datetime"
             spoken = _friendly_datetime(c["appointment_date"], c["appointment_time"])
-            return f"I heard {spoken}. Is that correct?"
+            return f"{READBACK_LEAD} {spoken}. {PROMPT_IS_CORRECT}"
         if c["appointment_date"] and c["appointment_time"] and state.get("datetime_confirmed"):
             state["step"] = "ask_reason"
 
     if state["step"] == "ask_reason":
         if not c["reason"]:
-            return "Finally, what is the reason for your visit?"
+            return PROMPT_ASK_REASON
         state["step"] = "confirm"
 
     if state["step"] == "confirm":
         return (
-            f"Perfect. I’ve got {c['patient_name']} with email {c['patient_email']}, "
+            f"{PROMPT_CONFIRM_OPENER} I’ve got {c['patient_name']} with email {c['patient_email']}, "
             f"on {c['appointment_date']} at {c['appointment_time']} for {c['reason']}. "
-            "Shall I book this now?"
+            f"{PROMPT_CONFIRM_TAIL}"
         )
 
     state["step"] = "ask_name"
-    return "Could I take your full name, please?"
+    return PROMPT_ASK_NAME
+
+# Speculative TTS: while STT/NLP run, synthesize the prompts this turn will most likely end with
+TTS_SPECULATE = os.getenv("TTS_SPECULATE", "1") == "1"
+
+speculation_stats = {
+    "turns": 0,
+    "launched": 0,
+    "hits": 0,
+    "misses": 0,
+    "seconds_saved": 0.0,
+}
+
+def _likely_next_prompts(state: dict) -> list[str]:
+    """
+    Replies predictable before STT finishes, computed by running the state machine on a copy:
+    the "yes" outcome of a confirmation step (read-backs and the summary come out exact)
+    and a re-ask of the current question. Value steps depend on what the caller says,
+    so only their re-ask is predicted.
+    """
+    predictions = []
+    step = state["step"]
+    if step == "confirm":
+        predictions.append(PROMPT_BOOKED)
+    elif step in ("confirm_email", "confirm_datetime"):
+        yes = copy.deepcopy(state)
+        yes["email_confirmed" if step == "confirm_email" else "datetime_confirmed"] = True
+        text = _next_prompt(yes)
+        # Read-backs served from clips need no synthesis
+        if not (TTS_READBACK_CLIPS and _readback_clips(yes, text)):
+            predictions.append(text)
+    if step != "greeting":
+        predictions.append(_next_prompt(copy.deepcopy(state)))
+    return predictions
+
+def _start_speculation(state: dict, fmt: str) -> dict[str, tuple[asyncio.Task, float]]:
+    tasks = {}
+    for text in _likely_next_prompts(state):
+        if text in tasks or is_cached(text, fmt):
+            continue
+        task = asyncio.create_task(speak_bytes(text, fmt))
+        task.add_done_callback(_note_speculation_done)
+        tasks[text] = (task, time.perf_counter())
+    speculation_stats["turns"] += 1
+    speculation_stats["launched"] += len(tasks)
+    return tasks
+
+# When each speculative synthesis finished; a hit only saved the time it actually overlapped
+_speculation_done_at: "weakref.WeakKeyDictionary[asyncio.Task, float]" = weakref.WeakKeyDictionary()
+
+def _note_speculation_done(task: asyncio.Task) -> None:
+    _speculation_done_at[task] = time.perf_counter()
+
+def _settle_speculation(tasks: dict[str, tuple[asyncio.Task, float]], response_text: str) -> None:
+    """
+    Credit the head start of a matching prediction and drop the rest. A dropped
+    synthesis that is already upstream still lands in the shared cache.
+    """
+    now = time.perf_counter()
+    for text, (task, started) in tasks.items():
+        if text == response_text and not task.cancelled():
+            speculation_stats["hits"] += 1
+            speculation_stats["seconds_saved"] += min(_speculation_done_at.get(task, now), now) - started
+        else:
+            speculation_stats["misses"] += 1
+            task.cancel()
+    tasks.clear()
+
+# Step-aware STT vocabulary hints (Whisper `prompt`): bias decoding toward what this step expects
+STT_PROMPT_HINTS = os.getenv("STT_PROMPT_HINTS", "1") == "1"
+
+_CONFIRM_STEPS = {"confirm_email", "confirm_datetime", "confirm"}
+_EXPECTING_VALUE = {"ask_email", "confirm_email", "ask_date", "ask_time", "confirm_datetime", "ask_reason"}
+
+stt_hint_stats = {
+    "hinted_turns": 0,
+    "turns_by_step": {},
+    "reasks_by_step": {},
+}
+
+def _stt_hint(state: dict) -> str | None:
+    """
+    A short transcript-like prompt for the step being answered; None when no hint helps.
+    """
+    if not STT_PROMPT_HINTS:
+        return None
+    step = state["step"]
+    if step == "ask_email":
+        letters = ", ".join(string.ascii_uppercase)
+        providers = ", ".join(["Gmail", "Outlook", "Hotmail", "Yahoo", "iCloud", "ProtonMail", "AOL", "Zoho"])
+        # Vocabulary only: a sample address gets copied into transcripts of unclear audio
+        return f"{letters}. At, dot, underscore, dash. Dot com, dot co dot uk. {providers}."
+    if step in ("ask_date", "confirm_datetime"):
+        days = ", ".join(datetime.date(2024, 1, i).strftime("%A") for i in range(1, 8))
+        months = ", ".join(datetime.date(2024, m, 1).strftime("%B") for m in range(1, 13))
+        return f"Next {days}. The 15th of {months}. Tomorrow, in two weeks."
+    if step == "ask_time":
+        return "2 pm, 14:30, half past nine, quarter to three, 10 in the morning."
+    if step in ("confirm_email", "confirm"):
+        return "Yes, that's correct. No, that's wrong."
+    return None
+
+def _note_turn(step_before: str, state: dict) -> None:
+    # Same value-step after the turn means the caller has to be asked again
+    turns = stt_hint_stats["turns_by_step"]
+    turns[step_before] = turns.get(step_before, 0) + 1
+    if step_before in _EXPECTING_VALUE and state["step"] == step_before:
+        reasks = stt_hint_stats["reasks_by_step"]
+        reasks[step_before] = reasks.get(step_before, 0) + 1
+
+async def _apply_turn(session_id: str, state: dict, user_text: str, silent: bool = False) -> tuple[str, str, str]:
+    """
+    Everything after STT: confirmations, extraction, booking and the next prompt.
+    Returns (response_text, calendar_error, session_ended). Shared by the upload and streaming endpoints.
+    """
+    c = state["captured"]
+    calendar_error = ""
+    session_ended = "0"
+    step_before = state["step"]
+
+    expecting_value = state["step"] in _EXPECTING_VALUE
+    if silent or (expecting_value and is_filler(user_text)):
+        # Nothing said (or just filler): repeat the current question
+        response_text = _next_prompt(state)
+    else:
+        if state["step"] == "confirm_email":
+            if is_affirmative(user_text):
+                state["email_confirmed"] = True
+            elif is_negative(user_text):
+                state["email_confirmed"] = False
+                c["patient_email"] = None
+                state["step"] = "ask_email"
+
+        elif state["step"] == "confirm_datetime":
+            if is_affirmative(user_text):
+                state["datetime_confirmed"] = True
+            elif is_negative(user_text):
+                state["datetime_confirmed"] = False
+                c["appointment_date"] = None
+                c["appointment_time"] = None
+                state["step"] = "ask_date"
+
+        else:
+            before_date = c.get("appointment_date")
+            before_time = c.get("appointment_time")
+
+            try:
+                try:
+                    async with stage("llm"):
+                        fields = await asyncio.to_thread(
+                            extract_fields_with_llm, user_text, c, state["step"], EXTRACT_OPPORTUNISTIC
+                        )
+                except Overloaded:
+                    # LLM stage saturated: answer from the rules alone rather than shedding the turn
+                    fields = await asyncio.to_thread(
+                        extract_fields_with_rules, user_text, c, state["step"], EXTRACT_OPPORTUNISTIC
+                    )
+                for k, v in (fields or {}).items():
+                    if v:
+                        c[k] = v
+
+                if c.get("patient_email") and state["step"] == "ask_email":
+                    state["email_confirmed"] = False
+                    state["step"] = "confirm_email"
+
+                after_date = c.get("appointment_date")
+                after_time = c.get("appointment_time")
+                if (after_date and after_time) and (before_date != after_date or before_time != after_time):
+                    state["datetime_confirmed"] = False
+                    state["step"] = "confirm_datetime"
+            except Exception:
+                pass
+
+        response_text = _next_prompt(state)
+
+        # Booking on affirmative at confirm step
+        booking_complete = False
+        if state["step"] == "confirm" and is_affirmative(user_text):
+            try:
+                date_str = c.get("appointment_date")
+                time_str = c.get("appointment_time") or "09:00"
+                if not date_str:
+                    raise ValueError("Missing appointment date.")
+                dt = datetime.datetime.fromisoformat(f"{date_str}T{time_str}:00")
+                end = dt + datetime.timedelta(minutes=30)
+
+                payload = {
+                    "patient_name": c.get("patient_name"),
+                    "patient_email": c.get("patient_email"),
+                    "reason": c.get("reason"),
+                    "start": dt,
+                    "end": end,
+                }
+
+                service = get_google_calendar_service()
+                result = create_google_calendar_event(service, payload)
+                if result.get("status") == "success":
+                    response_text = PROMPT_BOOKED
+                    session_ended = "1"
+                else:
+                    calendar_error = result.get("message", "Unknown calendar error")
+                    response_text = PROMPT_BOOKING_FAILED
+                booking_complete = True
+            except Exception as e:
+                calendar_error = str(e)
+                response_text = PROMPT_BOOKING_FAILED
+                booking_complete = True
+
+        if booking_complete:
+            conversation_states.pop(session_id, None)
+
+    _note_turn(step_before, state)
+    return response_text, calendar_error, session_ended
+
+async def _reply_audio(state: dict, response_text: str, fmt: str):
+    """
+    Audio for the reply: spliced read-back clips, a cached render, or a live
+    stream (async iterator of chunks) when the text isn't cached yet.
+    """
+    clips = _readback_clips(state, response_text) if TTS_READBACK_CLIPS else None
+    if clips:
+        return await speak_clips(clips, fmt, response_text)
+
+    audio_bytes = await cached_speech(response_text, fmt)
+    if audio_bytes is None and should_stream(response_text, fmt):
+        return await stream_speech(response_text, fmt)
+    if audio_bytes is None:
+        audio_bytes = await speak_bytes(response_text, fmt)
+    return audio_bytes
+
+def _overloaded_response(e: Overloaded, fmt: str) -> Response:
+    """
+    Fast shed reply: the cached "please hold" clip if we have one, else a bare 429/503.
+    Never synthesizes; the point is to spend nothing while overloaded.
+    """
+    headers = {"Retry-After": str(e.retry_after)}
+    clip = resident_speech(PROMPT_HOLD, fmt) if ADMISSION_HOLD_AUDIO else None
+    if clip is None:
+        raise HTTPException(status_code=e.status, detail=str(e), headers=headers)
+    headers.update({
+        "X-Bot-Text": quote(PROMPT_HOLD),
+        "Access-Control-Expose-Headers": "X-Bot-Text, Retry-After",
+        "Vary": "Accept",
+    })
+    return Response(content=clip, status_code=e.status, media_type=TTS_FORMATS[fmt], headers=headers)
 
 @router.post("/process")
 async def process_audio(
     session_id: str = Form(...),
     audio: UploadFile = File(...),
     init: int = Form(0),
+    format: str | None = Form(None),
+    accept: str | None = Header(None),
 ):
     """
-    STT -> rule-first NLP (+ LLM fallback only to fill gaps) -> confirmations -> TTS (MP3).
+    STT -> rule-first NLP (+ LLM fallback only to fill gaps) -> confirmations -> TTS.
+    Output format comes from the `format` field or the Accept header (default MP3).
     """
-    filename = f"{datetime.datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}_{audio.filename or 'user.webm'}"
-    file_path = os.path.join(TEMP_AUDIO_DIR, filename)
-    with open(file_path, "wb") as f:
-        shutil.copyfileobj(audio.file, f)
+    try:
+        audio_format = negotiate_format(format, accept)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    media_type = TTS_FORMATS[audio_format]
 
     user_text = ""
     response_text = ""
     calendar_error = ""
     session_ended = "0"
+    speech_ms = None
+    speculative: dict[str, tuple[asyncio.Task, float]] = {}
+    admitted = False
 
     try:
+        await enter_turn(session_id)
+        admitted = True
         state = _get_session_state(session_id)
         c = state["captured"]
 
-        file_is_tiny = os.path.getsize(file_path) < 600
+        # The upload is forwarded to STT straight from its buffer; size it without copying
+        upload_size = audio.size
+        if upload_size is None:
+            audio.file.seek(0, os.SEEK_END)
+            upload_size = audio.file.tell()
+            audio.file.seek(0)
+        file_is_tiny = upload_size < 600
         is_init_turn = bool(init) or file_is_tiny or state["step"] == "greeting"
 
         if is_init_turn:
             response_text = _next_prompt(state)
         else:
-            user_text = _normalise_text(transcribe_with_openai(file_path))
-
-            expecting_value = state["step"] in {"ask_email", "confirm_email", "ask_date", "ask_time", "confirm_datetime", "ask_reason"}
-            if expecting_value and is_filler(user_text):
-                response_text = _next_prompt(state)
+            if TTS_SPECULATE:
+                speculative = _start_speculation(state, audio_format)
+
+            # VAD + optional re-encode in the prep pool: trim silence, skip STT for silence-only uploads
+            # A bare "yes"/"no" can be shorter than VAD_MIN_SPEECH_MS; at a confirmation any
+            # voiced frame goes to STT rather than re-asking the same question
+            prep = await prepare_async(
+                await audio.read(), audio.filename, audio.content_type, want_pcm=STT_BACKEND == "local",
+                min_speech_ms=0 if state["step"] in _CONFIRM_STEPS else None,
+            )
+            speech_ms = prep["speech_ms"]
+            if prep["silent"]:
+                transcript = ""
             else:
-                if state["step"] == "confirm_email":
-                    if is_affirmative(user_text):
-                        state["email_confirmed"] = True
-                    elif is_negative(user_text):
-                        state["email_confirmed"] = False
-                        c["patient_email"] = None
-                        state["step"] = "ask_email"
-
-                elif state["step"] == "confirm_datetime":
-                    if is_affirmative(user_text):
-                        state["datetime_confirmed"] = True
-                    elif is_negative(user_text):
-                        state["datetime_confirmed"] = False
-                        c["appointment_date"] = None
-                        c["appointment_time"] = None
-                        state["step"] = "ask_date"
-
-                else:
-                    before_date = c.get("appointment_date")
-                    before_time = c.get("appointment_time")
-
-                    try:
-                        fields = extract_fields_with_llm(user_text, c)
-                        for k, v in (fields or {}).items():
-                            if v:
-                                c[k] = v
-
-                        if c.get("patient_email") and state["step"] == "ask_email":
-                            state["email_confirmed"] = False
-                            state["step"] = "confirm_email"
-
-                        after_date = c.get("appointment_date")
-                        after_time = c.get("appointment_time")
-                        if (after_date and after_time) and (before_date != after_date or before_time != after_time):
-                            state["datetime_confirmed"] = False
-                            state["step"] = "confirm_datetime"
-                    except Exception:
-                        pass
-
-                response_text = _next_prompt(state)
-
-                # Booking on affirmative at confirm step
-                booking_complete = False
-                if state["step"] == "confirm" and is_affirmative(user_text):
-                    try:
-                        date_str = c.get("appointment_date")
-                        time_str = c.get("appointment_time") or "09:00"
-                        if not date_str:
-                            raise ValueError("Missing appointment date.")
-                        dt = datetime.datetime.fromisoformat(f"{date_str}T{time_str}:00")
-                        end = dt + datetime.timedelta(minutes=30)
-
-                        payload = {
-                            "patient_name": c.get("patient_name"),
-                            "patient_email": c.get("patient_email"),
-                            "reason": c.get("reason"),
-                            "start": dt,
-                            "end": end,
-                        }
-
-                        service = get_google_calendar_service()
-                        result = create_google_calendar_event(service, payload)
-                        if result.get("status") == "success":
-                            response_text = "Your appointment is booked. You’ll receive a confirmation by email shortly. Anything else I can help with?"
-                            session_ended = "1"
-                        else:
-                            calendar_error = result.get("message", "Unknown calendar error")
-                            response_text = "I couldn't complete the booking just now. Would you like me to try again?"
-                        booking_complete = True
-                    except Exception as e:
-                        calendar_error = str(e)
-                        response_text = "I couldn't complete the booking just now. Would you like me to try again?"
-                        booking_complete = True
-
-                if booking_complete:
-                    conversation_states.pop(session_id, None)
-
-        audio_file_path = await speak_text(response_text)
+                hint = _stt_hint(state)
+                if hint:
+                    stt_hint_stats["hinted_turns"] += 1
+                # Async STT keeps the worker free for other turns (and lets speculative TTS overlap)
+                async with stage("stt"):
+                    transcript = await transcribe_async(
+                        prep["audio"], filename=prep["filename"], content_type=prep["content_type"],
+                        pcm=prep["pcm"], prompt=hint,
+                    )
+            user_text = _normalise_text(transcript)
+
+            response_text, calendar_error, session_ended = await _apply_turn(
+                session_id, state, user_text, silent=prep["silent"]
+            )
 
         headers = {
             "X-User-Transcript": quote(user_text)[:4000],
@@ -280,16 +595,218 @@ async def process_audio(
             "X-Agent-State": quote(state["step"]),
             "X-Calendar-Error": quote(calendar_error)[:4000] if calendar_error else "",
             "X-Session-Ended": session_ended,
-            "Access-Control-Expose-Headers": "X-User-Transcript, X-Bot-Text, X-Agent-State, X-Calendar-Error, X-Session-Ended",
+            "X-Speech-Ms": "" if speech_ms is None else str(speech_ms),
+            "Access-Control-Expose-Headers": "X-User-Transcript, X-Bot-Text, X-Agent-State, X-Calendar-Error, X-Session-Ended, X-Speech-Ms",
+            "Vary": "Accept",
         }
-        return FileResponse(path=audio_file_path, media_type="audio/mpeg", headers=headers)
 
+        if speculative:
+            _settle_speculation(speculative, response_text)
+
+        reply = await _reply_audio(state, response_text, audio_format)
+        if isinstance(reply, bytes):
+            return Response(content=reply, media_type=media_type, headers=headers)
+        return StreamingResponse(reply, media_type=media_type, headers=headers)
+
+    except Overloaded as e:
+        print(f"process_audio shed: {e}")
+        return _overloaded_response(e, audio_format)
+    except STTTimeout as e:
+        print(f"process_audio STT timeout: {e}")
+        raise HTTPException(status_code=504, detail=str(e))
+    except TTSUnavailable as e:
+        print(f"process_audio TTS unavailable: {e}")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         print(f"process_audio error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-        except Exception:
-            pass
+        for task, _ in speculative.values():
+            task.cancel()
+        if admitted:
+            leave_turn(session_id)
+
+# Streaming STT over a WebSocket: PCM in, partial/final transcripts and reply audio out
+# Partials re-send audio that the final transcript sends again; hosted Whisper bills every
+# second of it, so they default to off there and only ever cover a trailing window
+WS_PARTIALS = os.getenv("WS_PARTIALS", "0" if STT_BACKEND == "openai" else "1") == "1"
+WS_PARTIAL_INTERVAL_MS = int(os.getenv("WS_PARTIAL_INTERVAL_MS", "1000"))
+WS_PARTIAL_WINDOW_MS = int(os.getenv("WS_PARTIAL_WINDOW_MS", "5000"))
+
+stream_stats = {
+    "sessions": 0,
+    "utterances": 0,
+    "partials": 0,
+    "partials_shed": 0,
+    "partial_audio_ms_total": 0,  # audio sent to STT for partials, on top of the finals
+    "errors": 0,
+    "endpoint_to_final_ms_total": 0.0,
+    "endpoint_to_reply_ms_total": 0.0,
+}
+
+async def _transcribe_pcm(pcm: bytes, prompt: str | None = None) -> str:
+    transcript = await transcribe_async(
+        pcm_to_wav(pcm), filename="speech.wav", content_type="audio/wav", pcm=pcm, prompt=prompt
+    )
+    return _normalise_text(transcript)
+
+async def _send_partial(websocket: WebSocket, pcm: bytes, prompt: str | None = None) -> None:
+    try:
+        # Partials share the STT stage cap with final transcripts
+        async with stage("stt"):
+            text = await _transcribe_pcm(pcm, prompt)
+    except asyncio.CancelledError:
+        raise
+    except Overloaded:
+        stream_stats["partials_shed"] += 1  # a partial is optional; never queue an error for it
+        return
+    except Exception as e:
+        print(f"stream_audio partial transcript failed: {e}")
+        return
+    if text:
+        stream_stats["partials"] += 1
+        await websocket.send_json({"type": "partial", "text": text})
+
+async def _send_reply(websocket: WebSocket, state: dict, response_text: str, fmt: str,
+                      calendar_error: str = "", session_ended: str = "0") -> None:
+    await websocket.send_json({
+        "type": "reply",
+        "text": response_text,
+        "state": state["step"],
+        "format": fmt,
+        "calendar_error": calendar_error,
+        "session_ended": session_ended,
+    })
+    reply = await _reply_audio(state, response_text, fmt)
+    if isinstance(reply, bytes):
+        await websocket.send_bytes(reply)
+    else:
+        async for chunk in reply:
+            await websocket.send_bytes(chunk)
+    await websocket.send_json({"type": "reply_end"})
+
+async def _finish_utterance(websocket: WebSocket, session_id: str, pcm: bytes, fmt: str,
+                            speculative: dict[str, tuple[asyncio.Task, float]]) -> None:
+    state = _get_session_state(session_id)
+    if state["step"] == "greeting":
+        await _send_reply(websocket, state, _next_prompt(state), fmt)
+        return
+
+    endpoint_at = time.perf_counter()
+    hint = _stt_hint(state)
+    if hint:
+        stt_hint_stats["hinted_turns"] += 1
+    async with stage("stt"):
+        user_text = await _transcribe_pcm(pcm, hint)
+    stream_stats["utterances"] += 1
+    stream_stats["endpoint_to_final_ms_total"] += (time.perf_counter() - endpoint_at) * 1000
+    await websocket.send_json({"type": "final", "text": user_text})
+
+    response_text, calendar_error, session_ended = await _apply_turn(session_id, state, user_text, silent=not user_text)
+    if speculative:
+        _settle_speculation(speculative, response_text)
+    stream_stats["endpoint_to_reply_ms_total"] += (time.perf_counter() - endpoint_at) * 1000
+    await _send_reply(websocket, state, response_text, fmt, calendar_error, session_ended)
+
+@router.websocket("/stream")
+async def stream_audio(websocket: WebSocket, session_id: str, format: str | None = None):
+    """
+    Continuous alternative to /process. Binary frames carry 16 kHz mono s16le PCM;
+    text frames carry {"type": "init"} (greeting) or {"type": "end"} (force end of utterance).
+    The server endpoints on trailing silence and sends JSON events
+    (partial, final, reply, reply_end, error) with the reply audio as binary frames.
+    """
+    try:
+        fmt = negotiate_format(format, None)
+    except ValueError as e:
+        await websocket.close(code=1003, reason=str(e))
+        return
+    await websocket.accept()
+    stream_stats["sessions"] += 1
+
+    endpointer = Endpointer()
+    partial_task: asyncio.Task | None = None
+    partial_at_ms = 0
+    speculative: dict[str, tuple[asyncio.Task, float]] = {}
+    speculated = False
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+
+            ended = False
+            if message.get("bytes"):
+                ended = endpointer.feed(message["bytes"])
+            elif message.get("text"):
+                try:
+                    event = json.loads(message["text"])
+                except ValueError:
+                    event = None
+                if not isinstance(event, dict):
+                    await websocket.send_json(
+                        {"type": "error", "status": 400, "detail": "Text frames must be a JSON object"}
+                    )
+                    continue
+                if event.get("type") == "init":
+                    state = _get_session_state(session_id)
+                    await _send_reply(websocket, state, _next_prompt(state), fmt)
+                    continue
+                ended = event.get("type") == "end" and endpointer.started
+
+            # Speculative TTS starts with the speech, not after the endpoint
+            if endpointer.started and not speculated and TTS_SPECULATE:
+                speculative = _start_speculation(_get_session_state(session_id), fmt)
+                speculated = True
+
+            if not ended:
+                # Re-transcribe the utterance so far, one request at a time
+                due = endpointer.utterance_ms - partial_at_ms >= WS_PARTIAL_INTERVAL_MS
+                if WS_PARTIALS and endpointer.started and due and (partial_task is None or partial_task.done()):
+                    partial_at_ms = endpointer.utterance_ms
+                    hint = _stt_hint(_get_session_state(session_id))
+                    window = endpointer.audio[-WS_PARTIAL_WINDOW_MS * 32:]  # 16 kHz s16le: 32 bytes per ms
+                    stream_stats["partial_audio_ms_total"] += len(window) // 32
+                    partial_task = asyncio.create_task(_send_partial(websocket, bytes(window), hint))
+                continue
+
+            if partial_task is not None:
+                partial_task.cancel()
+                partial_task = None
+            partial_at_ms = 0
+            admitted = False
+            try:
+                await enter_turn(session_id)
+                admitted = True
+                await _finish_utterance(websocket, session_id, endpointer.take(), fmt, speculative)
+            except Overloaded as e:
+                stream_stats["errors"] += 1
+                endpointer.reset()
+                await websocket.send_json(
+                    {"type": "error", "status": e.status, "detail": str(e), "retry_after": e.retry_after}
+                )
+            except (STTTimeout, TTSUnavailable) as e:
+                stream_stats["errors"] += 1
+                status = 504 if isinstance(e, STTTimeout) else 503
+                await websocket.send_json({"type": "error", "status": status, "detail": str(e)})
+            except WebSocketDisconnect:
+                raise
+            except Exception as e:
+                stream_stats["errors"] += 1
+                print(f"stream_audio error: {e}")
+                await websocket.send_json({"type": "error", "status": 500, "detail": str(e)})
+            finally:
+                if admitted:
+                    leave_turn(session_id)
+                for task, _ in speculative.values():
+                    task.cancel()
+                speculative = {}
+                speculated = False
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if partial_task is not None:
+            partial_task.cancel()
+        for task, _ in speculative.values():
+            task.cancel()
@@ -0,0 +1,146 @@
+# app/utils/admission.py
+import os
+import time
+import asyncio
+
+# Admission control: a global cap on turns in flight plus per-stage caps, each with a bounded queue
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1") == "1"
+ADMISSION_MAX_TURNS = int(os.getenv("ADMISSION_MAX_TURNS", "16"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "32"))
+ADMISSION_QUEUE_TIMEOUT_S = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_S", "5"))
+ADMISSION_STT_CONCURRENCY = int(os.getenv("ADMISSION_STT_CONCURRENCY", "8"))
+ADMISSION_LLM_CONCURRENCY = int(os.getenv("ADMISSION_LLM_CONCURRENCY", "8"))
+ADMISSION_STAGE_QUEUE = int(os.getenv("ADMISSION_STAGE_QUEUE", "32"))
+ADMISSION_RETRY_AFTER_S = int(os.getenv("ADMISSION_RETRY_AFTER_S", "1"))
+# Answer shed turns with a pre-rendered "please hold" clip (only if it is already cached)
+ADMISSION_HOLD_AUDIO = os.getenv("ADMISSION_HOLD_AUDIO", "1") == "1"
+
+
+class Overloaded(RuntimeError):
+    """
+    Raised when a turn or stage is shed. `status` is 429 when the session already
+    has a turn in flight, 503 when the server is saturated.
+    """
+
+    def __init__(self, message: str, status: int = 503, retry_after: int = ADMISSION_RETRY_AFTER_S):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class Limiter:
+    """
+    Semaphore with a bounded wait queue and a wait budget; sheds instead of piling up.
+    """
+
+    def __init__(self, name: str, concurrency: int, max_queue: int, timeout_s: float):
+        self.name = name
+        self.max_queue = max_queue
+        self.timeout_s = timeout_s
+        self._slots = asyncio.Semaphore(max(1, concurrency))
+        self.stats = {
+            "concurrency": max(1, concurrency),
+            "active": 0,
+            "queued": 0,
+            "max_queued": 0,
+            "admitted": 0,
+            "shed_queue_full": 0,
+            "shed_timeout": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+        }
+
+    async def acquire(self) -> None:
+        stats = self.stats
+        if self._slots.locked() and stats["queued"] >= self.max_queue:
+            stats["shed_queue_full"] += 1
+            raise Overloaded(f"{self.name} queue is full")
+        stats["queued"] += 1
+        stats["max_queued"] = max(stats["max_queued"], stats["queued"])
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.timeout_s)
+        except asyncio.TimeoutError:
+            stats["shed_timeout"] += 1
+            raise Overloaded(f"waited more than {self.timeout_s}s for {self.name}")
+        finally:
+            stats["queued"] -= 1
+        waited = time.perf_counter() - started
+        stats["wait_seconds_total"] += waited
+        stats["wait_seconds_max"] = max(stats["wait_seconds_max"], waited)
+        stats["admitted"] += 1
+        stats["active"] += 1
+
+    def release(self) -> None:
+        self.stats["active"] -= 1
+        self._slots.release()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.release()
+
+
+class _Bypass:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        pass
+
+
+_turns = Limiter("turn", ADMISSION_MAX_TURNS, ADMISSION_MAX_QUEUE, ADMISSION_QUEUE_TIMEOUT_S)
+# TTS is already bounded by its own pool in tts.py (TTS_MAX_CONCURRENCY / TTS_MAX_QUEUE)
+_stages = {
+    "stt": Limiter("stt", ADMISSION_STT_CONCURRENCY, ADMISSION_STAGE_QUEUE, ADMISSION_QUEUE_TIMEOUT_S),
+    "llm": Limiter("llm", ADMISSION_LLM_CONCURRENCY, ADMISSION_STAGE_QUEUE, ADMISSION_QUEUE_TIMEOUT_S),
+}
+_active_sessions: set[str] = set()
+admission_stats = {"busy_session": 0}
+
+
+async def enter_turn(session_id: str) -> None:
+    """
+    Admit one turn for `session_id` or raise Overloaded. Pair with leave_turn().
+    """
+    if not ADMISSION_ENABLED:
+        return
+    if session_id in _active_sessions:
+        admission_stats["busy_session"] += 1
+        raise Overloaded("A turn for this session is already in progress", status=429)
+    _active_sessions.add(session_id)
+    try:
+        await _turns.acquire()
+    except BaseException:
+        _active_sessions.discard(session_id)
+        raise
+
+
+def leave_turn(session_id: str) -> None:
+    if not ADMISSION_ENABLED:
+        return
+    _active_sessions.discard(session_id)
+    _turns.release()
+
+
+def stage(name: str):
+    """
+    `async with stage("stt"): ...` holds a slot of that stage's limiter.
+    """
+    limiter = _stages.get(name) if ADMISSION_ENABLED else None
+    return limiter if limiter is not None else _Bypass()
+
+
+def admission_snapshot() -> dict:
+    def with_avg(stats: dict) -> dict:
+        done = stats["admitted"]
+        return {**stats, "wait_seconds_avg": round(stats["wait_seconds_total"] / done, 4) if done else None}
+
+    return {
+        "enabled": ADMISSION_ENABLED,
+        **admission_stats,
+        "turns": with_avg(_turns.stats),
+        "stages": {name: with_avg(limiter.stats) for name, limiter in _stages.items()},
+    }
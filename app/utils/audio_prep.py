@@ -0,0 +1,356 @@
+# app/utils/audio_prep.py
+import io
+import os
+import time
+import wave
+import asyncio
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource  # CPU time of ffmpeg children (POSIX only)
+except ImportError:  # pragma: no cover - Windows
+    resource = None
+
+try:
+    import ffmpeg  # ffmpeg-python; needs the ffmpeg binary on PATH
+except ImportError:  # pragma: no cover - optional
+    ffmpeg = None
+
+# Server-side VAD before STT: trims leading/trailing silence, skips silence-only uploads
+STT_VAD = os.getenv("STT_VAD", "1") == "1"
+VAD_SAMPLE_RATE = 16000
+VAD_FRAME_MS = int(os.getenv("VAD_FRAME_MS", "20"))
+VAD_MIN_RMS = float(os.getenv("VAD_MIN_RMS", "300"))        # absolute floor, int16 units
+VAD_NOISE_RATIO = float(os.getenv("VAD_NOISE_RATIO", "3.0"))  # speech must be this far above the noise floor
+VAD_MAX_ZCR = float(os.getenv("VAD_MAX_ZCR", "0.35"))       # higher crossing rates look like hiss, not voice
+VAD_PAD_MS = int(os.getenv("VAD_PAD_MS", "200"))
+VAD_MIN_SPEECH_MS = int(os.getenv("VAD_MIN_SPEECH_MS", "120"))  # a clipped "no" is ~150 ms of voice
+
+# Live endpointing for streamed audio: end-of-utterance after this much trailing quiet
+ENDPOINT_SILENCE_MS = int(os.getenv("ENDPOINT_SILENCE_MS", "700"))
+ENDPOINT_MAX_UTTERANCE_MS = int(os.getenv("ENDPOINT_MAX_UTTERANCE_MS", "30000"))
+
+# Optional re-encode of the (trimmed) 16 kHz mono audio into a compact codec before upload.
+# Without it, trimmed audio goes out as FLAC, or as the original upload when that is smaller.
+STT_NORMALIZE = os.getenv("STT_NORMALIZE", "0") == "1"
+STT_NORMALIZE_CODEC = os.getenv("STT_NORMALIZE_CODEC", "opus")  # opus | flac
+STT_PREP_WORKERS = int(os.getenv("STT_PREP_WORKERS", "2"))
+
+# codec -> (ffmpeg output args, filename, MIME type)
+_ENCODINGS = {
+    "opus": ({"format": "ogg", "acodec": "libopus", "audio_bitrate": "24k", "application": "voip"}, "speech.ogg", "audio/ogg"),
+    "flac": ({"format": "flac", "compression_level": 8}, "speech.flac", "audio/flac"),
+}
+
+vad_stats = {
+    "processed": 0,
+    "silent_skipped": 0,
+    "speech_ms_total": 0,
+    "trimmed_ms_total": 0,
+    "failures": 0,
+}
+
+normalize_stats = {
+    "normalized": 0,
+    "bytes_in": 0,
+    "bytes_out": 0,
+    "bytes_saved": 0,
+    "cpu_ms_total": 0.0,
+}
+
+_pool: ProcessPoolExecutor | None = None
+
+
+def decode_pcm(data: bytes) -> bytes:
+    """
+    Decode any container ffmpeg understands into 16 kHz mono s16le PCM.
+    """
+    out, _ = (
+        ffmpeg.input("pipe:0")
+        .output("pipe:1", format="s16le", acodec="pcm_s16le", ac=1, ar=VAD_SAMPLE_RATE)
+        .run(input=data, capture_stdout=True, quiet=True)
+    )
+    return out
+
+
+def encode_compact(pcm: bytes, codec: str | None = None) -> tuple[bytes, str, str]:
+    """
+    16 kHz mono s16le PCM -> (encoded bytes, filename, MIME type) in `codec` (default STT_NORMALIZE_CODEC).
+    """
+    args, filename, content_type = _ENCODINGS[codec or STT_NORMALIZE_CODEC]
+    out, _ = (
+        ffmpeg.input("pipe:0", format="s16le", ac=1, ar=VAD_SAMPLE_RATE)
+        .output("pipe:1", ac=1, ar=VAD_SAMPLE_RATE, **args)
+        .run(input=pcm, capture_stdout=True, quiet=True)
+    )
+    return out, filename, content_type
+
+
+def pcm_to_wav(pcm: bytes) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(VAD_SAMPLE_RATE)
+        w.writeframes(pcm)
+    return buf.getvalue()
+
+
+def _frame_features(samples: array, frame_len: int) -> list[tuple[float, float]]:
+    feats = []
+    for start in range(0, len(samples) - frame_len + 1, frame_len):
+        frame = samples[start:start + frame_len]
+        rms = (sum(x * x for x in frame) / frame_len) ** 0.5
+        crossings = sum(1 for a, b in zip(frame, frame[1:]) if (a < 0) != (b < 0))
+        feats.append((rms, crossings / frame_len))
+    return feats
+
+
+def detect_speech(pcm: bytes, min_speech_ms: int | None = None) -> tuple[int, int, int]:
+    """
+    Energy + zero-crossing VAD over 16 kHz s16le PCM.
+    Returns (start_byte, end_byte, speech_ms); speech_ms is 0 for silence-only audio, i.e.
+    less than `min_speech_ms` (default VAD_MIN_SPEECH_MS) of voiced frames.
+    """
+    if min_speech_ms is None:
+        min_speech_ms = VAD_MIN_SPEECH_MS
+    samples = array("h")
+    samples.frombytes(pcm[: len(pcm) - len(pcm) % 2])
+    frame_len = VAD_SAMPLE_RATE * VAD_FRAME_MS // 1000
+    feats = _frame_features(samples, frame_len)
+    if not feats:
+        return 0, 0, 0
+
+    # Noise floor: the quietest tenth of frames
+    levels = sorted(rms for rms, _ in feats)
+    noise_floor = levels[len(levels) // 10]
+    threshold = max(VAD_MIN_RMS, noise_floor * VAD_NOISE_RATIO)
+
+    voiced = [
+        rms > threshold and (zcr < VAD_MAX_ZCR or rms > 2 * threshold)
+        for rms, zcr in feats
+    ]
+    speech_frames = sum(voiced)
+    if not speech_frames or speech_frames * VAD_FRAME_MS < min_speech_ms:
+        return 0, 0, 0
+
+    first = voiced.index(True)
+    last = len(voiced) - 1 - voiced[::-1].index(True)
+    pad = VAD_PAD_MS // VAD_FRAME_MS
+    first = max(0, first - pad)
+    last = min(len(voiced) - 1, last + pad)
+    return first * frame_len * 2, (last + 1) * frame_len * 2, speech_frames * VAD_FRAME_MS
+
+
+class Endpointer:
+    """
+    Incremental energy endpointing over a live 16 kHz s16le stream. feed() returns True
+    once speech has been followed by ENDPOINT_SILENCE_MS of quiet, or the utterance hits
+    ENDPOINT_MAX_UTTERANCE_MS. Before speech starts only VAD_PAD_MS of pre-roll is kept.
+    """
+
+    def __init__(self):
+        self.frame_bytes = VAD_SAMPLE_RATE * VAD_FRAME_MS // 1000 * 2
+        self.noise_floor: float | None = None
+        self._carry = b""
+        self.reset()
+
+    def reset(self) -> None:
+        self.audio = bytearray()
+        self.started = False
+        self.speech_ms = 0
+        self.silence_ms = 0
+
+    @property
+    def utterance_ms(self) -> int:
+        return len(self.audio) * 1000 // (2 * VAD_SAMPLE_RATE)
+
+    def _voiced(self, frame: bytes) -> bool:
+        samples = array("h")
+        samples.frombytes(frame)
+        rms = (sum(x * x for x in samples) / len(samples)) ** 0.5
+        if self.noise_floor is None:
+            # The stream may open mid-word: start no higher than the floor that makes
+            # VAD_MIN_RMS the threshold, then let quiet frames raise it to the room's level
+            self.noise_floor = min(rms, VAD_MIN_RMS / VAD_NOISE_RATIO)
+        voiced = rms > max(VAD_MIN_RMS, self.noise_floor * VAD_NOISE_RATIO)
+        if not voiced:
+            # Track the floor on quiet frames only, so speech doesn't raise it
+            self.noise_floor = 0.95 * self.noise_floor + 0.05 * rms
+        return voiced
+
+    def feed(self, chunk: bytes) -> bool:
+        data = self._carry + chunk
+        usable = len(data) - len(data) % self.frame_bytes
+        self._carry = data[usable:]
+        preroll = VAD_PAD_MS * VAD_SAMPLE_RATE * 2 // 1000
+        for offset in range(0, usable, self.frame_bytes):
+            frame = data[offset:offset + self.frame_bytes]
+            voiced = self._voiced(frame)
+            self.audio += frame
+            if voiced:
+                self.started = True
+                self.speech_ms += VAD_FRAME_MS
+                self.silence_ms = 0
+            elif self.started:
+                self.silence_ms += VAD_FRAME_MS
+            else:
+                del self.audio[:-preroll or None]
+
+            ended = self.started and self.silence_ms >= ENDPOINT_SILENCE_MS
+            if ended and self.speech_ms < VAD_MIN_SPEECH_MS:
+                self.reset()  # a click or cough, not an utterance
+            elif ended or self.utterance_ms >= ENDPOINT_MAX_UTTERANCE_MS:
+                # Frames after the endpoint belong to the next utterance
+                self._carry = data[offset + self.frame_bytes:]
+                return True
+        return False
+
+    def take(self) -> bytes:
+        """
+        The finished utterance (without most of its trailing silence); resets for the next one.
+        """
+        keep = len(self.audio) - max(0, self.silence_ms - VAD_PAD_MS) * VAD_SAMPLE_RATE * 2 // 1000
+        pcm = bytes(self.audio[:keep])
+        self.reset()
+        return pcm
+
+
+def _cpu_seconds() -> float:
+    cpu = time.process_time()
+    if resource is not None:
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu += usage.ru_utime + usage.ru_stime
+    return cpu
+
+
+def prepare_for_stt(
+    data: bytes,
+    filename: str | None = None,
+    content_type: str | None = None,
+    want_pcm: bool = False,
+    min_speech_ms: int | None = None,
+) -> dict:
+    """
+    Blocking; runs in the prep process pool. Decodes once, then applies VAD trimming
+    and/or compact re-encoding. Returns the audio to send to STT plus what happened:
+    {"audio", "filename", "content_type", "pcm", "silent", "speech_ms", "trimmed_ms",
+     "normalized", "bytes_in", "bytes_out", "cpu_ms", "encode_cpu_ms", "error"}.
+    `cpu_ms` covers the whole run; `encode_cpu_ms` only the STT_NORMALIZE re-encode.
+    `want_pcm` returns the trimmed 16 kHz PCM (for the local Whisper engine) instead of re-encoding.
+    `min_speech_ms` overrides VAD_MIN_SPEECH_MS for the silence-only check.
+    When neither stage applies, or decoding fails, the upload passes through untouched.
+    """
+    result = {
+        "audio": data,
+        "filename": filename,
+        "content_type": content_type,
+        "pcm": None,
+        "silent": False,
+        "speech_ms": None,
+        "trimmed_ms": 0,
+        "normalized": False,
+        "bytes_in": len(data),
+        "bytes_out": len(data),
+        "cpu_ms": 0.0,
+        "encode_cpu_ms": 0.0,
+        "error": None,
+    }
+    if not (STT_VAD or STT_NORMALIZE or want_pcm) or ffmpeg is None:
+        return result
+
+    started = _cpu_seconds()
+    try:
+        pcm = decode_pcm(data)
+        if STT_VAD:
+            start, end, speech_ms = detect_speech(pcm, min_speech_ms)
+            result["speech_ms"] = speech_ms
+            if speech_ms == 0:
+                result.update({"audio": None, "silent": True, "bytes_out": 0})
+                return result
+            total_ms = len(pcm) * 1000 // (2 * VAD_SAMPLE_RATE)
+            pcm = pcm[start:end]
+            result["trimmed_ms"] = total_ms - len(pcm) * 1000 // (2 * VAD_SAMPLE_RATE)
+
+        if want_pcm:
+            result["pcm"] = pcm
+            return result
+        if STT_NORMALIZE:
+            encode_started = _cpu_seconds()
+            audio, name, mime = encode_compact(pcm)
+            result["encode_cpu_ms"] = round((_cpu_seconds() - encode_started) * 1000, 2)
+            result["normalized"] = True
+        else:
+            # Trimming only: lossless FLAC is still ~4x a browser's opus, so keep the
+            # upload unless cutting the silence actually made it smaller
+            audio, name, mime = encode_compact(pcm, "flac")
+            if len(audio) >= len(data):
+                result["trimmed_ms"] = 0
+                return result
+        result.update({"audio": audio, "filename": name, "content_type": mime, "bytes_out": len(audio)})
+    except Exception as e:
+        result.update({
+            "audio": data, "filename": filename, "content_type": content_type,
+            "silent": False, "speech_ms": None, "trimmed_ms": 0, "normalized": False,
+            "bytes_out": len(data), "error": str(e),
+        })
+    finally:
+        result["cpu_ms"] = round((_cpu_seconds() - started) * 1000, 2)
+    return result
+
+
+def _record(result: dict) -> None:
+    # Workers are separate processes, so counters are aggregated here from each result
+    if result["error"]:
+        vad_stats["failures"] += 1
+        print(f"STT pre-processing failed, sending upload as-is: {result['error']}")
+        return
+    if result["speech_ms"] is not None:
+        vad_stats["processed"] += 1
+        if result["silent"]:
+            vad_stats["silent_skipped"] += 1
+        else:
+            vad_stats["speech_ms_total"] += result["speech_ms"]
+            vad_stats["trimmed_ms_total"] += result["trimmed_ms"]
+    if result["normalized"]:
+        normalize_stats["normalized"] += 1
+        normalize_stats["bytes_in"] += result["bytes_in"]
+        normalize_stats["bytes_out"] += result["bytes_out"]
+        normalize_stats["bytes_saved"] += result["bytes_in"] - result["bytes_out"]
+        # Decode and VAD run with or without normalisation; only the re-encode is its cost
+        normalize_stats["cpu_ms_total"] += result["encode_cpu_ms"]
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=max(1, STT_PREP_WORKERS))
+    return _pool
+
+
+async def prepare_async(
+    data: bytes,
+    filename: str | None = None,
+    content_type: str | None = None,
+    want_pcm: bool = False,
+    min_speech_ms: int | None = None,
+) -> dict:
+    """
+    Run prepare_for_stt in the worker pool (its VAD loop is CPU-bound Python).
+    """
+    if not (STT_VAD or STT_NORMALIZE or want_pcm) or ffmpeg is None:
+        return prepare_for_stt(data, filename, content_type)
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(
+        _get_pool(), prepare_for_stt, data, filename, content_type, want_pcm, min_speech_ms
+    )
+    _record(result)
+    return result
+
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,116 @@
+# app/utils/janitor.py
+import os
+import time
+import asyncio
+
+# Quotas applied to each managed directory (0 disables a limit)
+JANITOR_INTERVAL_S = float(os.getenv("JANITOR_INTERVAL_S", "300"))
+JANITOR_MAX_BYTES = int(os.getenv("JANITOR_MAX_BYTES", str(200 * 1024 * 1024)))
+JANITOR_MAX_AGE_S = float(os.getenv("JANITOR_MAX_AGE_S", str(24 * 3600)))
+JANITOR_MAX_FILES = int(os.getenv("JANITOR_MAX_FILES", "2000"))
+# Uploads older than this at startup belong to a dead request (other workers may share the dir)
+JANITOR_ORPHAN_AGE_S = float(os.getenv("JANITOR_ORPHAN_AGE_S", "120"))
+
+janitor_stats = {
+    "runs": 0,
+    "files_removed": 0,
+    "bytes_reclaimed": 0,
+    "orphans_removed": 0,
+    "last_run_at": None,
+    "last_run_seconds": None,
+}
+
+
+def _list_files(directory: str) -> list[tuple[str, int, float]]:
+    files = []
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.is_file():
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    files.append((entry.path, st.st_size, st.st_mtime))
+    except FileNotFoundError:
+        pass
+    return files
+
+
+def _remove(path: str) -> bool:
+    try:
+        os.remove(path)
+        return True
+    except OSError:
+        return False
+
+
+def sweep_directory(directory: str, max_bytes: int, max_age_s: float, max_files: int) -> tuple[int, int]:
+    """
+    Delete expired files, then the oldest files until the byte and count quotas hold.
+    Returns (files_removed, bytes_reclaimed).
+    """
+    now = time.time()
+    files = sorted(_list_files(directory), key=lambda f: f[2])
+    removed = reclaimed = 0
+    kept = []
+    for path, size, mtime in files:
+        if max_age_s and now - mtime > max_age_s and _remove(path):
+            removed += 1
+            reclaimed += size
+        else:
+            kept.append((path, size, mtime))
+
+    total = sum(size for _, size, _ in kept)
+    count = len(kept)
+    for path, size, _ in kept:
+        over_bytes = max_bytes and total > max_bytes
+        over_files = max_files and count > max_files
+        if not (over_bytes or over_files):
+            break
+        if _remove(path):
+            removed += 1
+            reclaimed += size
+            total -= size
+            count -= 1
+    return removed, reclaimed
+
+
+def sweep_orphans(directory: str, min_age_s: float = JANITOR_ORPHAN_AGE_S) -> tuple[int, int]:
+    """
+    Startup pass over the upload dir: anything older than `min_age_s` was left by a dead request.
+    """
+    removed, reclaimed = sweep_directory(directory, 0, min_age_s or 0.001, 0)
+    janitor_stats["orphans_removed"] += removed
+    janitor_stats["files_removed"] += removed
+    janitor_stats["bytes_reclaimed"] += reclaimed
+    return removed, reclaimed
+
+
+def run_sweep(directories: list[str]) -> tuple[int, int]:
+    started = time.perf_counter()
+    removed = reclaimed = 0
+    for directory in directories:
+        r, b = sweep_directory(directory, JANITOR_MAX_BYTES, JANITOR_MAX_AGE_S, JANITOR_MAX_FILES)
+        removed += r
+        reclaimed += b
+    janitor_stats["runs"] += 1
+    janitor_stats["files_removed"] += removed
+    janitor_stats["bytes_reclaimed"] += reclaimed
+    janitor_stats["last_run_at"] = time.time()
+    janitor_stats["last_run_seconds"] = round(time.perf_counter() - started, 4)
+    return removed, reclaimed
+
+
+async def run_janitor(directories: list[str]) -> None:
+    """
+    Background task: sweep the directories every JANITOR_INTERVAL_S, off the event loop.
+    """
+    while True:
+        try:
+            removed, reclaimed = await asyncio.to_thread(run_sweep, directories)
+            if removed:
+                print(f"Janitor removed {removed} files ({reclaimed} bytes)")
+        except Exception as e:
+            print(f"Janitor sweep failed: {e}")
+        await asyncio.sleep(JANITOR_INTERVAL_S)
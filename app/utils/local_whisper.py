@@ -0,0 +1,191 @@
+# app/utils/local_whisper.py
+import os
+import time
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+
+# On-box Whisper: model loaded once per worker process, short utterances decoded in batches
+LOCAL_WHISPER_MODEL = os.getenv("LOCAL_WHISPER_MODEL", "base.en")
+LOCAL_WHISPER_LANGUAGE = os.getenv("LOCAL_WHISPER_LANGUAGE", "en")
+LOCAL_WHISPER_WORKERS = int(os.getenv("LOCAL_WHISPER_WORKERS", "1"))
+LOCAL_WHISPER_THREADS = int(os.getenv("LOCAL_WHISPER_THREADS", "0"))  # torch threads per worker; 0 = torch default
+LOCAL_WHISPER_BATCH_MAX = int(os.getenv("LOCAL_WHISPER_BATCH_MAX", "4"))
+LOCAL_WHISPER_BATCH_WAIT_MS = float(os.getenv("LOCAL_WHISPER_BATCH_WAIT_MS", "30"))
+
+SAMPLE_RATE = 16000
+_WINDOW_BYTES = 30 * SAMPLE_RATE * 2  # Whisper decodes fixed 30 s windows; longer audio goes solo
+
+# Latency per utterance length, so CPU-only deployments can size workers from real traffic
+_LENGTH_BUCKETS = [(2, "0-2s"), (5, "2-5s"), (10, "5-10s"), (30, "10-30s")]
+
+local_stt_stats = {
+    "batches": 0,
+    "batched_utterances": 0,
+    "long_utterances": 0,
+    "failures": 0,
+    "by_length": {label: {"count": 0, "total_ms": 0.0, "max_ms": 0.0} for _, label in _LENGTH_BUCKETS + [(None, "30s+")]},
+}
+
+_pool: ProcessPoolExecutor | None = None
+_pending: list[tuple[bytes, str | None, asyncio.Future]] = []
+_flush_handle: asyncio.TimerHandle | None = None
+
+# Worker-process globals
+_model = None
+
+
+def _init_worker(model_name: str, threads: int) -> None:
+    global _model
+    import torch
+    import whisper
+
+    if threads:
+        torch.set_num_threads(threads)
+    _model = whisper.load_model(model_name, device="cpu")
+    print(f"Local Whisper {model_name!r} loaded in worker {os.getpid()}")
+
+
+def _ready() -> int:
+    return os.getpid()
+
+
+def _to_float(pcm: bytes):
+    import numpy as np
+
+    return np.frombuffer(pcm[: len(pcm) - len(pcm) % 2], dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def _decode_batch(pcms: list[bytes], language: str, prompt: str | None = None) -> list[str]:
+    """
+    Runs in a worker: pad each utterance to the 30 s window and decode them as one batch.
+    """
+    import torch
+    import whisper
+
+    mels = [
+        whisper.log_mel_spectrogram(whisper.pad_or_trim(_to_float(pcm)), n_mels=_model.dims.n_mels)
+        for pcm in pcms
+    ]
+    options = whisper.DecodingOptions(
+        language=language or None, fp16=False, without_timestamps=True, prompt=prompt or None
+    )
+    with torch.no_grad():
+        results = whisper.decode(_model, torch.stack(mels), options)
+    return [r.text.strip() for r in results]
+
+
+def _transcribe_long(pcm: bytes, language: str, prompt: str | None = None) -> str:
+    result = _model.transcribe(_to_float(pcm), language=language or None, fp16=False, initial_prompt=prompt or None)
+    return result["text"].strip()
+
+
+def _record(pcm_bytes: int, elapsed_ms: float) -> None:
+    seconds = pcm_bytes / (2 * SAMPLE_RATE)
+    label = next((name for limit, name in _LENGTH_BUCKETS if seconds <= limit), "30s+")
+    bucket = local_stt_stats["by_length"][label]
+    bucket["count"] += 1
+    bucket["total_ms"] = round(bucket["total_ms"] + elapsed_ms, 2)
+    bucket["max_ms"] = max(bucket["max_ms"], round(elapsed_ms, 2))
+
+
+def start_local_whisper() -> None:
+    """
+    Spawn the worker pool and make every worker load the model now, not on the first turn.
+    """
+    global _pool
+    if _pool is not None:
+        return
+    workers = max(1, LOCAL_WHISPER_WORKERS)
+    _pool = ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(LOCAL_WHISPER_MODEL, LOCAL_WHISPER_THREADS),
+    )
+    for future in [_pool.submit(_ready) for _ in range(workers)]:
+        future.result()
+
+
+def stop_local_whisper() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def _run_batch(batch: list[tuple[bytes, asyncio.Future]], prompt: str | None) -> None:
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    try:
+        texts = await loop.run_in_executor(
+            _pool, _decode_batch, [pcm for pcm, _ in batch], LOCAL_WHISPER_LANGUAGE, prompt
+        )
+    except Exception as e:
+        local_stt_stats["failures"] += 1
+        for _, fut in batch:
+            if not fut.done():
+                fut.set_exception(e)
+        return
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    local_stt_stats["batches"] += 1
+    local_stt_stats["batched_utterances"] += len(batch)
+    for (pcm, fut), text in zip(batch, texts):
+        _record(len(pcm), elapsed_ms)
+        if not fut.done():
+            fut.set_result(text)
+
+
+def _flush() -> None:
+    global _flush_handle
+    if _flush_handle is not None:
+        _flush_handle.cancel()
+        _flush_handle = None
+    # One decode per distinct prompt: DecodingOptions apply to the whole batch
+    groups: dict[str | None, list[tuple[bytes, asyncio.Future]]] = {}
+    for pcm, prompt, fut in _pending:
+        groups.setdefault(prompt, []).append((pcm, fut))
+    _pending.clear()
+    for prompt, batch in groups.items():
+        asyncio.ensure_future(_run_batch(batch, prompt))
+
+
+async def transcribe_local(pcm: bytes, prompt: str | None = None) -> str:
+    """
+    Transcribe 16 kHz mono s16le PCM. Utterances arriving within LOCAL_WHISPER_BATCH_WAIT_MS
+    of each other share one decode; anything longer than 30 s is transcribed on its own.
+    """
+    global _flush_handle
+    if _pool is None:
+        start_local_whisper()
+    loop = asyncio.get_running_loop()
+
+    if len(pcm) > _WINDOW_BYTES:
+        started = time.perf_counter()
+        try:
+            text = await loop.run_in_executor(_pool, _transcribe_long, pcm, LOCAL_WHISPER_LANGUAGE, prompt)
+        except Exception:
+            local_stt_stats["failures"] += 1
+            raise
+        local_stt_stats["long_utterances"] += 1
+        _record(len(pcm), (time.perf_counter() - started) * 1000)
+        return text
+
+    fut = loop.create_future()
+    _pending.append((pcm, prompt, fut))
+    if len(_pending) >= max(1, LOCAL_WHISPER_BATCH_MAX):
+        _flush()
+    elif _flush_handle is None:
+        _flush_handle = loop.call_later(LOCAL_WHISPER_BATCH_WAIT_MS / 1000, _flush)
+    return await fut
+
+
+def local_stt_snapshot() -> dict:
+    snap = dict(local_stt_stats)
+    snap["by_length"] = {
+        label: {**b, "avg_ms": round(b["total_ms"] / b["count"], 2) if b["count"] else None}
+        for label, b in local_stt_stats["by_length"].items()
+    }
+    snap["avg_batch_size"] = (
+        round(local_stt_stats["batched_utterances"] / local_stt_stats["batches"], 2)
+        if local_stt_stats["batches"] else None
+    )
+    return snap
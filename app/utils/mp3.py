@@ -0,0 +1,61 @@
+# app/utils/mp3.py
+from typing import Optional
+
+# Bitrates (kbps) indexed by header bits, for Layer III
+_BITRATES_V1 = [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320]
+_BITRATES_V2 = [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]
+_SAMPLE_RATES = {
+    3: [44100, 48000, 32000],  # MPEG-1
+    2: [22050, 24000, 16000],  # MPEG-2
+    0: [11025, 12000, 8000],   # MPEG-2.5
+}
+
+
+def _strip_id3(data: bytes) -> bytes:
+    """
+    Drop a leading ID3v2 tag and a trailing ID3v1 tag, if present.
+    """
+    if data[:3] == b"ID3" and len(data) >= 10:
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        footer = 10 if data[5] & 0x10 else 0
+        data = data[10 + size + footer:]
+    if len(data) >= 128 and data[-128:-125] == b"TAG":
+        data = data[:-128]
+    return data
+
+
+def _frame_length(data: bytes, pos: int) -> Optional[int]:
+    """
+    Length in bytes of the Layer III frame starting at `pos`, or None if no frame header is there.
+    """
+    if pos + 4 > len(data) or data[pos] != 0xFF or (data[pos + 1] & 0xE0) != 0xE0:
+        return None
+    version = (data[pos + 1] >> 3) & 0x03
+    layer = (data[pos + 1] >> 1) & 0x03
+    bitrate_idx = (data[pos + 2] >> 4) & 0x0F
+    rate_idx = (data[pos + 2] >> 2) & 0x03
+    padding = (data[pos + 2] >> 1) & 0x01
+    if version == 1 or layer != 1 or bitrate_idx in (0, 15) or rate_idx == 3:
+        return None
+    bitrate = (_BITRATES_V1 if version == 3 else _BITRATES_V2)[bitrate_idx] * 1000
+    sample_rate = _SAMPLE_RATES[version][rate_idx]
+    coeff = 144 if version == 3 else 72
+    return coeff * bitrate // sample_rate + padding
+
+
+def _strip_info_frame(data: bytes) -> bytes:
+    """
+    Drop a leading Xing/Info (VBR header) frame: its frame count only describes
+    one segment and would make players mis-report the spliced duration.
+    """
+    length = _frame_length(data, 0)
+    if length and (b"Xing" in data[4:64] or b"Info" in data[4:64]):
+        return data[length:]
+    return data
+
+
+def splice_mp3(parts: list[bytes]) -> bytes:
+    """
+    Concatenate MP3 clips into one playable stream by joining their raw frames.
+    """
+    return b"".join(_strip_info_frame(_strip_id3(p)) for p in parts if p)
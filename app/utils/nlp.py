@@ -1,12 +1,18 @@
 # app/utils/nlp.py
+import os
 import re
 import json
+import time
 import datetime
 from typing import Optional, Tuple, Dict, Any
 
 from dateparser.search import search_dates
 import dateparser
-from openai import OpenAI
+
+from app.utils.openai_client import get_client
+
+# Outside the step's own extractors, also pick up volunteered info behind cheap gates
+EXTRACT_OPPORTUNISTIC = os.getenv("EXTRACT_OPPORTUNISTIC", "0") == "1"
 
 FILLERS = {
     "ok", "okay", "okay thanks", "thanks", "thank you", "yep", "yeah", "alright",
@@ -39,36 +45,47 @@ def _today_00():
 EMAIL_REGEX = re.compile(r"\b([a-z0-9._%+\-]+@[a-z0-9.\-]+\.[a-z]{2,}(?:\.[a-z]{2,})?)\b", re.I)
 DOMAIN_REGEX = re.compile(r"([a-z0-9\-]+(?:\.[a-z0-9\-]+)+)", re.I)  # e.g., highwaysindustry.com, example.co.uk
 
+# One scan: lead-ins to drop, spoken symbol words, literal @/. and whitespace runs
+_SPOKEN_TOKEN = re.compile(
+    r"(?P<lead>\b(?:my\s+email\s+is|email\s+is|email\s*address\s*is|the\s+email\s+is|it\s+is|it's)\b[:,\.\s]*)"
+    r"|(?P<word>\b(?:underscore|hyphen|dash|period|dot|at)\b)"
+    r"|(?P<sym>[@.])"
+    r"|(?P<ws>\s+)"
+)
+_SPOKEN_SYMBOLS = {"underscore": "_", "hyphen": "-", "dash": "-", "period": ".", "dot": ".", "at": "@"}
+_EMAIL_LOCAL_BEFORE_AT = re.compile(r"([a-z0-9._%+\-]{1,64})\s*at\s*$", re.I)
+
 def _normalize_spoken_tokens(text: str) -> str:
     """
     Convert spoken markers to symbols and tidy spacing *around* @ and .
     Avoids gluing stray words into the local-part.
+    Single pass: whitespace before @/. is dropped as the symbol is emitted,
+    whitespace after it is skipped until the next real text.
     """
     t = (text or "").lower()
-
-    # Strip lead-ins that often precede the address
-    t = re.sub(r"\b(my\s+email\s+is|email\s+is|email\s*address\s*is|the\s+email\s+is|it\s+is|it's)\b[:,\.\s]*", " ", t)
-
-    # Spoken tokens -> symbols
-    t = re.sub(r"\bunderscore\b", "_", t)
-    t = re.sub(r"\bhyphen\b", "-", t)
-    t = re.sub(r"\bdash\b", "-", t)
-    t = re.sub(r"\bperiod\b", ".", t)
-    t = re.sub(r"\bdot\b", ".", t)
-    t = re.sub(r"\bat\b", "@", t)
-
-    # Tighten whitespace around @ and .
-    t = re.sub(r"\s*@\s*", "@", t)
-    t = re.sub(r"\s*\.\s*", ".", t)
-
-    # Remove spaces occurring inside the domain (after @)
-    t = re.sub(r"(?<=@)\s+", "", t)
-
-    # Remove stray spaces adjacent to dots
-    t = re.sub(r"\s+(?=\.)", "", t)
-    t = re.sub(r"(?<=\.)\s+", "", t)
-
-    return t.strip()
+    out = []
+    glued = False  # last thing emitted was @ or .
+    pos = 0
+    for m in _SPOKEN_TOKEN.finditer(t):
+        if m.start() > pos:
+            out.append(t[pos:m.start()])
+            glued = False
+        pos = m.end()
+        kind = m.lastgroup
+        if kind == "lead" or kind == "ws":
+            if not glued:
+                out.append(" " if kind == "lead" else m.group())
+            continue
+        symbol = _SPOKEN_SYMBOLS[m.group()] if kind == "word" else m.group()
+        if symbol in "@.":
+            while out and out[-1].isspace():
+                out.pop()
+            glued = True
+        else:
+            glued = False
+        out.append(symbol)
+    out.append(t[pos:])
+    return "".join(out).strip()
 
 def _extract_email(user_text: str) -> Optional[str]:
     """
@@ -91,7 +108,7 @@ def _extract_email(user_text: str) -> Optional[str]:
         domain = m.group(1)
         start = m.start(1)
         left = t[:start]
-        m2 = re.search(r"([a-z0-9._%+\-]{1,64})\s*at\s*$", left, re.I)
+        m2 = _EMAIL_LOCAL_BEFORE_AT.search(left)
         if m2:
             local = m2.group(1)
             return f"{local}@{domain}"
@@ -206,18 +223,159 @@ def _ensure_future(dt: datetime.datetime) -> datetime.datetime:
     # Else assume next year
     return dt.replace(year=dt.year + 1)
 
-def _parse_date_time(text: str) -> Tuple[Optional[str], Optional[str]]:
+# Timings per dialogue step and per extractor (incl. fast-path vs dateparser date parsing)
+extraction_stats: Dict[str, Dict[str, Dict[str, float]]] = {"by_step": {}, "by_extractor": {}}
+
+def _note_timing(table: str, key: str, elapsed_ms: float) -> None:
+    entry = extraction_stats[table].setdefault(key, {"calls": 0, "total_ms": 0.0, "max_ms": 0.0})
+    entry["calls"] += 1
+    entry["total_ms"] = round(entry["total_ms"] + elapsed_ms, 3)
+    entry["max_ms"] = max(entry["max_ms"], round(elapsed_ms, 3))
+
+# Fast-path grammar for the absolute dates callers actually say; dateparser only when it can't decide
+_MONTH_TO_NUM = {
+    "january": 1, "february": 2, "march": 3, "april": 4, "may": 5, "june": 6, "july": 7,
+    "august": 8, "september": 9, "october": 10, "november": 11, "december": 12,
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "jun": 6, "jul": 7, "aug": 8,
+    "sep": 9, "sept": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+_ORDINAL_UNITS = {
+    "first": 1, "second": 2, "third": 3, "fourth": 4, "fifth": 5, "sixth": 6, "seventh": 7,
+    "eighth": 8, "ninth": 9,
+}
+_ORDINAL_TO_NUM = {
+    **_ORDINAL_UNITS,
+    "tenth": 10, "eleventh": 11, "twelfth": 12, "thirteenth": 13, "fourteenth": 14, "fifteenth": 15,
+    "sixteenth": 16, "seventeenth": 17, "eighteenth": 18, "nineteenth": 19, "twentieth": 20, "thirtieth": 30,
+    **{f"twenty {w}": 20 + n for w, n in _ORDINAL_UNITS.items()},
+    "thirty first": 31,
+}
+_COUNT_TO_NUM = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+}
+
+def _alternation(words) -> str:
+    return "|".join(re.escape(w).replace(r"\ ", r"[\s\-]") for w in sorted(words, key=len, reverse=True))
+
+_DAY_PATTERN = rf"(?P<day>\d{{1,2}})(?:st|nd|rd|th)?|(?P<day_word>{_alternation(_ORDINAL_TO_NUM)})"
+_MONTH_PATTERN = rf"(?P<month>{_alternation(_MONTH_TO_NUM)})\.?"
+_YEAR_PATTERN = r"(?:,?\s+(?P<year>20\d{2}))?"
+
+_ISO_DATE = re.compile(r"\b(?P<year>20\d{2})[-/](?P<month>\d{1,2})[-/](?P<day>\d{1,2})\b")
+_DAY_MONTH = re.compile(rf"\b(?:the\s+)?(?:{_DAY_PATTERN})\s+(?:of\s+)?{_MONTH_PATTERN}(?![a-z]){_YEAR_PATTERN}")
+_MONTH_DAY = re.compile(rf"\b{_MONTH_PATTERN}\s+(?:the\s+)?(?:{_DAY_PATTERN})\b{_YEAR_PATTERN}")
+_NUMERIC_DATE = re.compile(r"\b(?P<a>\d{1,2})[/\-](?P<b>\d{1,2})(?:[/\-](?P<year>\d{4}|\d{2}))?\b")
+# "the second" is a date only when nothing but a time or a closing word follows it;
+# "the second week", "the first available slot" are left to dateparser
+_DAY_ONLY = re.compile(
+    rf"\bthe\s+(?:{_DAY_PATTERN})\b"
+    r"(?=\s*(?:$|[,.!?])|\s+(?:at|please|then)\b)"
+)
+# "may" is a month only next to a day number, not when a verb follows ("at 10 may be later")
+_MAY_AS_VERB = re.compile(r"\s+(?!at\b)[a-z]")
+_IN_PERIOD = re.compile(
+    rf"\bin\s+(?:(?P<n>\d{{1,2}})|(?P<n_word>{_alternation(_COUNT_TO_NUM)}))\s+(?P<unit>days?|weeks?|fortnights?)\b"
+    r"|\bin\s+a\s+(?P<fortnight>fortnight)\b"
+)
+
+def _day_of(m: re.Match) -> int:
+    if m.group("day"):
+        return int(m.group("day"))
+    return _ORDINAL_TO_NUM[re.sub(r"[\s\-]+", " ", m.group("day_word"))]
+
+def _upcoming(today: datetime.date, month: int, day: int, year: Optional[int]) -> Optional[datetime.date]:
+    """
+    The date itself when the year is given, else its next occurrence (today counts).
+    """
+    try:
+        if year:
+            return datetime.date(year, month, day)
+        d = datetime.date(today.year, month, day)
+        return d if d >= today else datetime.date(today.year + 1, month, day)
+    except ValueError:
+        return None  # e.g. 31 June, 29 February; let dateparser decide
+
+def _fast_parse_date(text: str) -> Optional[datetime.date]:
+    """
+    '15 September', 'September 15th', 'the fifteenth', '15/09', '2025-09-15', 'in two weeks'.
+    Returns None whenever the form is missing or ambiguous (e.g. 05/09), so the caller falls back.
+    """
+    t = (text or "").lower()
+    today = _today_00().date()
+
+    m = _ISO_DATE.search(t)
+    if m:
+        try:
+            return datetime.date(int(m.group("year")), int(m.group("month")), int(m.group("day")))
+        except ValueError:
+            return None
+
+    m = _DAY_MONTH.search(t)
+    if m and m.group("month") == "may" and not m.group("year") and _MAY_AS_VERB.match(t, m.end()):
+        return None  # "10 may be later": leave it to dateparser's judgement
+    m = m or _MONTH_DAY.search(t)
+    if m:
+        year = int(m.group("year")) if m.group("year") else None
+        return _upcoming(today, _MONTH_TO_NUM[m.group("month")], _day_of(m), year)
+
+    m = _NUMERIC_DATE.search(t)
+    if m:
+        a, b = int(m.group("a")), int(m.group("b"))
+        if a > 12 >= b:
+            day, month = a, b
+        elif b > 12 >= a:
+            day, month = b, a
+        else:
+            return None  # 05/09: day-first or month-first is the caller's locale, not ours
+        year = m.group("year")
+        year = (int(year) + 2000 if len(year) == 2 else int(year)) if year else None
+        return _upcoming(today, month, day, year)
+
+    m = _IN_PERIOD.search(t)
+    if m:
+        if m.group("fortnight"):
+            return today + datetime.timedelta(days=14)
+        n = int(m.group("n")) if m.group("n") else _COUNT_TO_NUM[m.group("n_word")]
+        days = {"day": 1, "week": 7, "fortnight": 14}[m.group("unit").rstrip("s")]
+        return today + datetime.timedelta(days=n * days)
+
+    m = _DAY_ONLY.search(t)
+    if m:
+        day = _day_of(m)
+        month, year = today.month, today.year
+        if day < today.day:
+            month, year = (1, year + 1) if month == 12 else (month + 1, year)
+        try:
+            return datetime.date(year, month, day)
+        except ValueError:
+            return None
+
+    return None
+
+def _parse_date_time(text: str, absolute: bool = True) -> Tuple[Optional[str], Optional[str]]:
     """
     Rule-first:
       1) Relative weekday (this/next/coming) or plain weekday => date
       2) Time independently
-      3) If still missing date, try absolute date via dateparser (15 Sep, 09/15, 2025-09-15)
+      3) If still missing date, the fast-path grammar (_fast_parse_date), then dateparser
+         only for what it can't decide
+    `absolute=False` skips step 3, the expensive one.
     """
     date_val: Optional[datetime.date] = _compute_relative_weekday(text)
     time_str: Optional[str] = _parse_time_component(text)
 
-    if not date_val:
+    if not date_val and absolute:
+        t0 = time.perf_counter()
+        date_val = _fast_parse_date(text)
+        if date_val and date_val < _today_00().date():
+            # Explicit past dates (2024-09-15) get the same roll-forward dateparser results get
+            date_val = _ensure_future(datetime.datetime.combine(date_val, datetime.time())).date()
+        _note_timing("by_extractor", "date_fastpath" if date_val else "date_fastpath_miss", (time.perf_counter() - t0) * 1000)
+
+    if not date_val and absolute:
         # try absolute dates with dateparser
+        t0 = time.perf_counter()
         settings = {
             "PREFER_DATES_FROM": "future",
             "RELATIVE_BASE": _today_00(),
@@ -239,15 +397,78 @@ def _parse_date_time(text: str) -> Tuple[Optional[str], Optional[str]]:
             # If no time yet but dt had a time component (e.g., '2025-09-15 14:30')
             if not time_str and (dt.hour or dt.minute):
                 time_str = f"{dt.hour:02d}:{dt.minute:02d}"
+        _note_timing("by_extractor", "dateparser", (time.perf_counter() - t0) * 1000)
 
     date_str = date_val.isoformat() if date_val else None
     return date_str, time_str
 
 # ---------- Extraction API ----------
 
-def extract_fields_with_rules(user_text: str, captured: Dict[str, Any]) -> Dict[str, Optional[str]]:
+# Which extractors each dialogue step needs, and the fields it is asking for
+_STEP_EXTRACTORS = {
+    "ask_name": ("name",),
+    "ask_email": ("email",),
+    "ask_date": ("datetime",),
+    "ask_time": ("datetime",),
+    "ask_reason": ("reason",),
+}
+_STEP_FIELDS = {
+    "ask_name": ("patient_name",),
+    "ask_email": ("patient_email",),
+    "ask_date": ("appointment_date",),
+    "ask_time": ("appointment_time",),
+    "ask_reason": ("reason",),
+}
+_EXTRACTOR_FIELDS = {
+    "name": ("patient_name",),
+    "email": ("patient_email",),
+    "datetime": ("appointment_date", "appointment_time"),
+    "reason": ("reason",),
+}
+_NAME_REGEX = re.compile(r"(?:my name is|i am|it's|it is)\s+([a-z][a-z\s\-'`\.]+)", re.I)
+_REASON_REGEX = re.compile(r"(?:because|for|regarding|about)\s+([a-z0-9\s\-,'`\.]{3,})", re.I)
+_SPOKEN_EMAIL_HINT = re.compile(r"@|\bat\b", re.I)
+
+def _extract_name(user_text: str) -> Optional[str]:
+    m = _NAME_REGEX.search(user_text)
+    return re.sub(r"\s+", " ", m.group(1)).title() if m else None
+
+def _extract_reason(user_text: str) -> Optional[str]:
+    m = _REASON_REGEX.search(user_text)
+    return re.sub(r"\s+", " ", m.group(1)).strip() if m else None
+
+def _plan_extractors(user_text: str, captured: Dict[str, Any], step: Optional[str], opportunistic: bool) -> Dict[str, bool]:
+    """
+    extractor -> whether date parsing may fall back to dateparser ("datetime" only).
+    No step (or an unknown one) keeps the old behaviour: everything runs.
+    """
+    wanted = _STEP_EXTRACTORS.get(step)
+    if wanted is None:
+        plan = {"email": True, "datetime": True}
+    else:
+        # Asking for a time: only parse a date if one is actually mentioned
+        plan = {name: name != "datetime" or step == "ask_date" or _mentions_date(user_text) for name in wanted}
+        if opportunistic:
+            if "email" not in plan and _SPOKEN_EMAIL_HINT.search(user_text):
+                plan["email"] = True
+            if "datetime" not in plan and (_mentions_date(user_text) or _mentions_time(user_text)):
+                plan["datetime"] = _mentions_date(user_text)
+    if not captured.get("patient_name") and (wanted is None or "name" in wanted or opportunistic):
+        plan["name"] = True
+    if not captured.get("reason") and (wanted is None or "reason" in wanted or opportunistic):
+        plan["reason"] = True
+    return plan
+
+def extract_fields_with_rules(
+    user_text: str,
+    captured: Dict[str, Any],
+    step: Optional[str] = None,
+    opportunistic: bool = False,
+) -> Dict[str, Optional[str]]:
     """
     English-only: robust email + reliable date/relative weekday + time.
+    With `step`, only the extractors that step needs run (plus cheaply-gated
+    volunteered fields when `opportunistic`).
     """
     out: Dict[str, Optional[str]] = {
         "patient_name": None,
@@ -256,42 +477,50 @@ def extract_fields_with_rules(user_text: str, captured: Dict[str, Any]) -> Dict[
         "appointment_time": None,
         "reason": None,
     }
-
-    # Email
-    email = _extract_email(user_text)
-    if email:
-        out["patient_email"] = email
-
-    # Date/time
-    date_str, time_str = _parse_date_time(user_text)
-    if date_str: out["appointment_date"] = date_str
-    if time_str: out["appointment_time"] = time_str
-
-    # Name
-    if not captured.get("patient_name"):
-        m = re.search(r"(?:my name is|i am|it's|it is)\s+([a-z][a-z\s\-'`\.]+)", user_text, re.I)
-        if m:
-            out["patient_name"] = re.sub(r"\s+", " ", m.group(1)).title()
-
-    # Reason (simple heuristic)
-    if not captured.get("reason"):
-        m = re.search(r"(?:because|for|regarding|about)\s+([a-z0-9\s\-,'`\.]{3,})", user_text, re.I)
-        if m:
-            out["reason"] = re.sub(r"\s+", " ", m.group(1)).strip()
-
+    started = time.perf_counter()
+
+    for name, absolute in _plan_extractors(user_text, captured, step, opportunistic).items():
+        t0 = time.perf_counter()
+        if name == "email":
+            out["patient_email"] = _extract_email(user_text)
+        elif name == "datetime":
+            out["appointment_date"], out["appointment_time"] = _parse_date_time(user_text, absolute=absolute)
+        elif name == "name":
+            out["patient_name"] = _extract_name(user_text)
+        elif name == "reason":
+            out["reason"] = _extract_reason(user_text)
+        _note_timing("by_extractor", name, (time.perf_counter() - t0) * 1000)
+
+    _note_timing("by_step", step or "any", (time.perf_counter() - started) * 1000)
     return out
 
-def extract_fields_with_llm(user_text: str, captured: Dict[str, Any]) -> Dict[str, Optional[str]]:
+def extraction_snapshot() -> dict:
+    return {
+        table: {
+            key: {**entry, "avg_ms": round(entry["total_ms"] / entry["calls"], 3)}
+            for key, entry in rows.items()
+        }
+        for table, rows in extraction_stats.items()
+    }
+
+def extract_fields_with_llm(
+    user_text: str,
+    captured: Dict[str, Any],
+    step: Optional[str] = None,
+    opportunistic: bool = False,
+) -> Dict[str, Optional[str]]:
     """
     Rules first; fill only the gaps with LLM (English).
+    With `step`, the LLM is only consulted when the field that step asks for is still missing.
     """
-    fields = extract_fields_with_rules(user_text, captured)
+    fields = extract_fields_with_rules(user_text, captured, step=step, opportunistic=opportunistic)
 
-    need_llm = any(fields.get(k) is None for k in ("patient_email", "appointment_date", "appointment_time"))
+    targets = _STEP_FIELDS.get(step, ("patient_email", "appointment_date", "appointment_time"))
+    need_llm = any(fields.get(k) is None for k in targets)
     if not need_llm:
         return fields
 
-    client = OpenAI()
+    client = get_client()
     today = _today_00().date().isoformat()
 
     system = (
@@ -326,4 +555,8 @@ def extract_fields_with_llm(user_text: str, captured: Dict[str, Any]) -> Dict[st
         "appointment_time": fields.get("appointment_time") or data.get("appointment_time"),
         "reason": fields.get("reason") or data.get("reason"),
     }
+    if step in _STEP_FIELDS and not opportunistic:
+        # Only the fields this step's extractors own; the LLM's guesses at the rest are dropped
+        owned = {f for name in _STEP_EXTRACTORS[step] for f in _EXTRACTOR_FIELDS[name]}
+        merged = {k: (v if k in owned else fields.get(k)) for k, v in merged.items()}
     return merged
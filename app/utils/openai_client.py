@@ -0,0 +1,120 @@
+# app/utils/openai_client.py
+import os
+import threading
+import importlib.util
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+# Connection pool shared by STT, NLP and TTS
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "10"))
+OPENAI_KEEPALIVE_EXPIRY_S = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY_S", "60"))
+OPENAI_HTTP2 = os.getenv("OPENAI_HTTP2", "0") == "1"
+OPENAI_TIMEOUT_S = float(os.getenv("OPENAI_TIMEOUT_S", "30"))
+OPENAI_CONNECT_TIMEOUT_S = float(os.getenv("OPENAI_CONNECT_TIMEOUT_S", "5"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+
+_lock = threading.Lock()
+_clients: dict[str, OpenAI | AsyncOpenAI] = {}
+
+connection_stats = {
+    "requests": 0,
+    "connections_opened": 0,
+}
+
+
+def _count(name: str) -> None:
+    with _lock:
+        connection_stats[name] += 1
+
+
+def _trace(event_name: str, info: dict) -> None:
+    # httpcore reports every new TCP connection; requests without one reused the pool
+    if event_name == "connection.connect_tcp.complete":
+        _count("connections_opened")
+
+
+def _on_request(request: httpx.Request) -> None:
+    _count("requests")
+    request.extensions["trace"] = _trace
+
+
+async def _atrace(event_name: str, info: dict) -> None:
+    # httpcore's async interface awaits the trace callback, so it must be a coroutine function
+    _trace(event_name, info)
+
+
+async def _on_request_async(request: httpx.Request) -> None:
+    _count("requests")
+    request.extensions["trace"] = _atrace
+
+
+def _http2_enabled() -> bool:
+    if OPENAI_HTTP2 and importlib.util.find_spec("h2") is None:
+        print("Warning: OPENAI_HTTP2=1 but the 'h2' package is not installed; using HTTP/1.1.")
+        return False
+    return OPENAI_HTTP2
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(OPENAI_TIMEOUT_S, connect=OPENAI_CONNECT_TIMEOUT_S)
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+        keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY_S,
+    )
+
+
+def get_client() -> OpenAI:
+    """
+    Process-wide OpenAI client; reusing it keeps TLS connections warm across turns.
+    """
+    client = _clients.get("sync")
+    if client is not None:
+        return client
+    with _lock:
+        client = _clients.get("sync")
+        if client is None:
+            http_client = httpx.Client(
+                limits=_limits(),
+                timeout=_timeout(),
+                http2=_http2_enabled(),
+                event_hooks={"request": [_on_request]},
+            )
+            client = OpenAI(http_client=http_client, max_retries=OPENAI_MAX_RETRIES, timeout=_timeout())
+            _clients["sync"] = client
+    return client
+
+
+def get_async_client() -> AsyncOpenAI:
+    """
+    Async counterpart of get_client(), for callers running on the event loop.
+    Must be used from a single event loop (the uvicorn worker's).
+    """
+    client = _clients.get("async")
+    if client is not None:
+        return client
+    with _lock:
+        client = _clients.get("async")
+        if client is None:
+            http_client = httpx.AsyncClient(
+                limits=_limits(),
+                timeout=_timeout(),
+                http2=_http2_enabled(),
+                event_hooks={"request": [_on_request_async]},
+            )
+            client = AsyncOpenAI(http_client=http_client, max_retries=OPENAI_MAX_RETRIES, timeout=_timeout())
+            _clients["async"] = client
+    return client
+
+
+def connection_snapshot() -> dict:
+    with _lock:
+        snap = dict(connection_stats)
+    requests = snap["requests"]
+    snap["reuse_rate"] = round(1 - snap["connections_opened"] / requests, 4) if requests else None
+    return snap
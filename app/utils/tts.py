@@ -1,45 +1,445 @@
 import os
+import re
+import time
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
-from datetime import datetime
-from pathlib import Path
-from openai import OpenAI
+
+from app.utils.mp3 import splice_mp3
+from app.utils.tts_backends import TTSBackend, get_backend
+from app.utils.tts_cache import tts_cache, cache_key
 
 APP_DIR = os.path.dirname(os.path.dirname(__file__))  # .../app
+# Nothing writes here any more (audio is served from tts_cache); the janitor clears files left by older versions
 TTS_DIR = os.path.join(APP_DIR, "tts_audio")
 os.makedirs(TTS_DIR, exist_ok=True)
 
-# Use a model you have access to — switching to tts-1
-OPENAI_TTS_MODEL = os.getenv("OPENAI_TTS_MODEL", "tts-1")  
-OPENAI_TTS_VOICE = os.getenv("OPENAI_TTS_VOICE", "alloy")  # alloy, verse, shimmer
+# Engine selection: primary backend, the backend used when the primary errors or
+# exceeds its latency budget ("" disables failover), and that budget
+TTS_BACKEND = os.getenv("TTS_BACKEND", "openai")
+TTS_FALLBACK_BACKEND = os.getenv("TTS_FALLBACK_BACKEND", "local")
+TTS_LATENCY_BUDGET_S = float(os.getenv("TTS_LATENCY_BUDGET_S", "4"))
+
+OPENAI_TTS_FORMAT = os.getenv("OPENAI_TTS_FORMAT", "mp3")  # default when the client doesn't ask
+
+# OpenAI response_format -> Content-Type. Opus arrives in an Ogg container; pcm is 24 kHz 16-bit LE mono.
+TTS_FORMATS = {
+    "mp3": "audio/mpeg",
+    "opus": "audio/ogg; codecs=opus",
+    "aac": "audio/aac",
+    "flac": "audio/flac",
+    "wav": "audio/wav",
+    "pcm": "audio/pcm; rate=24000; channels=1",
+}
+_ACCEPT_TO_FORMAT = {
+    "audio/mpeg": "mp3", "audio/mp3": "mp3",
+    "audio/ogg": "opus", "audio/opus": "opus",
+    "audio/aac": "aac",  # raw ADTS, not MP4; an MP4-only Accept gets the default
+    "audio/flac": "flac",
+    "audio/wav": "wav", "audio/x-wav": "wav", "audio/wave": "wav",
+    "audio/pcm": "pcm", "audio/l16": "pcm",
+}
+# Formats whose encoded clips can be joined back to back (segmented synthesis)
+_SPLICEABLE = {"mp3", "aac", "pcm"}
+
+# Upstream concurrency: syntheses in flight, callers allowed to wait for a slot,
+# and the per-request deadline (queueing + synthesis) after which we fail fast
+TTS_MAX_CONCURRENCY = int(os.getenv("TTS_MAX_CONCURRENCY", "8"))
+TTS_MAX_QUEUE = int(os.getenv("TTS_MAX_QUEUE", "32"))
+TTS_DEADLINE_S = float(os.getenv("TTS_DEADLINE_S", "20"))
+
+# Forward upstream audio chunks to the client as they arrive (cache misses only)
+TTS_STREAMING = os.getenv("TTS_STREAMING", "0") == "1"
+TTS_STREAM_CHUNK_BYTES = int(os.getenv("TTS_STREAM_CHUNK_BYTES", "4096"))
+
+# Split long responses into sentences, synthesize them concurrently and splice the clips
+TTS_SEGMENTED = os.getenv("TTS_SEGMENTED", "0") == "1"
+
+# Splice email/date read-backs from pre-rendered clips instead of synthesizing them
+TTS_READBACK_CLIPS = os.getenv("TTS_READBACK_CLIPS", "0") == "1"
+
+# Startup warm-up of constant prompts
+TTS_PREWARM = os.getenv("TTS_PREWARM", "1") == "1"
+TTS_PREWARM_CONCURRENCY = int(os.getenv("TTS_PREWARM_CONCURRENCY", "8"))
+TTS_PREWARM_FORMATS = [f.strip() for f in os.getenv("TTS_PREWARM_FORMATS", OPENAI_TTS_FORMAT).split(",") if f.strip() in TTS_FORMATS]
+
+prewarm_report: dict = {}
+
+# Single-flight: concurrent misses for the same key share one upstream call
+_inflight: dict[str, asyncio.Future] = {}
+singleflight_stats = {"upstream_calls": 0, "coalesced": 0}
+
+clip_stats = {"readbacks": 0, "clips": 0, "clip_misses": 0}
+
+failover_stats = {
+    "primary_ok": 0,
+    "primary_errors": 0,
+    "budget_exceeded": 0,
+    "fallback_ok": 0,
+    "fallback_errors": 0,
+}
+
+
+class TTSUnavailable(RuntimeError):
+    """
+    Raised when a synthesis is shed (queue full) or misses its deadline.
+    """
+
+
+_slots = asyncio.Semaphore(max(1, TTS_MAX_CONCURRENCY))
+pool_stats = {
+    "active": 0,
+    "queued": 0,
+    "max_queued": 0,
+    "completed": 0,
+    "rejected": 0,
+    "deadline_exceeded": 0,
+    "wait_seconds_total": 0.0,
+    "wait_seconds_max": 0.0,
+}
+
+async def _acquire_slot() -> None:
+    if _slots.locked() and pool_stats["queued"] >= TTS_MAX_QUEUE:
+        pool_stats["rejected"] += 1
+        raise TTSUnavailable("TTS queue is full")
+    pool_stats["queued"] += 1
+    pool_stats["max_queued"] = max(pool_stats["max_queued"], pool_stats["queued"])
+    started = time.perf_counter()
+    try:
+        await _slots.acquire()
+    finally:
+        pool_stats["queued"] -= 1
+    waited = time.perf_counter() - started
+    pool_stats["wait_seconds_total"] += waited
+    pool_stats["wait_seconds_max"] = max(pool_stats["wait_seconds_max"], waited)
+    pool_stats["active"] += 1
 
-_executor = ThreadPoolExecutor(max_workers=2)
+def _release_slot() -> None:
+    pool_stats["active"] -= 1
+    pool_stats["completed"] += 1
+    _slots.release()
 
-def _generate_tts_audio(text: str) -> str:
+async def _within_deadline(coro):
+    try:
+        return await asyncio.wait_for(coro, TTS_DEADLINE_S)
+    except asyncio.TimeoutError:
+        pool_stats["deadline_exceeded"] += 1
+        raise TTSUnavailable(f"TTS did not finish within {TTS_DEADLINE_S}s")
+
+def negotiate_format(requested: str | None, accept: str | None) -> str:
+    """
+    Pick the output format: explicit form field first, then the Accept header
+    (highest q wins), else the default.
+    """
+    if requested:
+        fmt = requested.strip().lower()
+        if fmt not in TTS_FORMATS:
+            raise ValueError(f"Unsupported audio format {requested!r}; choose one of {', '.join(TTS_FORMATS)}")
+        return fmt
+
+    ranked = []
+    for i, item in enumerate((accept or "").split(",")):
+        media, *params = [p.strip() for p in item.split(";")]
+        q = 1.0
+        for p in params:
+            if p.startswith("q="):
+                try:
+                    q = float(p[2:])
+                except ValueError:
+                    q = 0.0
+        fmt = _ACCEPT_TO_FORMAT.get(media.lower())
+        if fmt and q > 0:
+            ranked.append((-q, i, fmt))
+    return min(ranked)[2] if ranked else OPENAI_TTS_FORMAT
+
+def _splice(parts: list[bytes], fmt: str) -> bytes:
+    if fmt == "mp3":
+        return splice_mp3(parts)
+    # ADTS (aac) frames and raw pcm samples concatenate as-is
+    return b"".join(parts)
+
+def _primary() -> TTSBackend:
+    return get_backend(TTS_BACKEND)
+
+def _fallback() -> TTSBackend | None:
+    if not TTS_FALLBACK_BACKEND or TTS_FALLBACK_BACKEND == TTS_BACKEND:
+        return None
+    return get_backend(TTS_FALLBACK_BACKEND)
+
+def _tts_key(text: str, fmt: str = OPENAI_TTS_FORMAT, backend: TTSBackend | None = None) -> str:
+    backend = backend or _primary()
+    return cache_key(backend.cache_model, backend.cache_voice, fmt, text)
+
+async def _fallback_audio(fallback: TTSBackend, text: str, fmt: str) -> bytes:
     """
-    Synchronous TTS using OpenAI Audio->Speech API -> MP3 file path.
+    Fallback output is cached under the fallback engine's own key, so it is reused
+    during an outage but never served once the primary recovers.
     """
-    client = OpenAI()
+    key = _tts_key(text, fmt, fallback)
+    audio = await tts_cache.get_async(key, fmt)
+    if audio is None:
+        try:
+            audio = await fallback.synthesize(text, fmt)
+        except Exception:
+            failover_stats["fallback_errors"] += 1
+            raise
+        tts_cache.put_async(key, fmt, audio)
+    failover_stats["fallback_ok"] += 1
+    return audio
+
+def _note_primary_failure(primary: TTSBackend, fallback: TTSBackend, err: BaseException) -> None:
+    if isinstance(err, asyncio.TimeoutError):
+        failover_stats["budget_exceeded"] += 1
+        reason = f"exceeded {TTS_LATENCY_BUDGET_S}s budget"
+    else:
+        failover_stats["primary_errors"] += 1
+        reason = str(err)
+    print(f"TTS {primary.name} failed ({reason}); using {fallback.name}")
 
-    fname = f"response_{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}.mp3"
-    out_path = Path(TTS_DIR) / fname
+async def _generate_with_failover(text: str, fmt: str) -> tuple[bytes, TTSBackend]:
+    primary = _primary()
+    fallback = _fallback()
+    if fallback is None:
+        return await primary.synthesize(text, fmt), primary
+    try:
+        audio = await asyncio.wait_for(primary.synthesize(text, fmt), TTS_LATENCY_BUDGET_S)
+        failover_stats["primary_ok"] += 1
+        return audio, primary
+    except Exception as e:
+        _note_primary_failure(primary, fallback, e)
+    return await _fallback_audio(fallback, text, fmt), fallback
 
-    with client.audio.speech.with_streaming_response.create(
-        model=OPENAI_TTS_MODEL,
-        voice=OPENAI_TTS_VOICE,
-        input=text,
-        response_format="mp3",
-    ) as resp:
-        resp.stream_to_file(out_path)
+# Sentence boundary: terminal punctuation followed by whitespace (keeps 'ali@gmail.com' intact)
+_SEGMENT_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
 
-    return str(out_path)
+def split_segments(text: str) -> list[str]:
+    return [seg for seg in _SEGMENT_BOUNDARY.split((text or "").strip()) if seg]
+
+async def cached_speech(text: str, fmt: str = OPENAI_TTS_FORMAT) -> bytes | None:
+    return await tts_cache.get_async(_tts_key(text, fmt), fmt)
+
+def resident_speech(text: str, fmt: str = OPENAI_TTS_FORMAT) -> bytes | None:
+    """
+    Memory tier only (pinned prompts): never waits on the disk.
+    """
+    return tts_cache.get_memory(_tts_key(text, fmt))
+
+def is_cached(text: str, fmt: str = OPENAI_TTS_FORMAT) -> bool:
+    return tts_cache.contains(_tts_key(text, fmt), fmt)
+
+def _segmented(text: str, fmt: str) -> bool:
+    return TTS_SEGMENTED and fmt in _SPLICEABLE and len(split_segments(text)) > 1
+
+def should_stream(text: str, fmt: str = OPENAI_TTS_FORMAT) -> bool:
+    """
+    Streaming applies to single-shot synthesis; segmented responses are spliced instead.
+    """
+    return TTS_STREAMING and _primary().supports_streaming and not _segmented(text, fmt)
 
-async def speak_text(text: str) -> str:
+def _start_flight(key: str) -> asyncio.Future:
     """
-    Async wrapper so the router can `await` TTS generation.
+    Register a stream as the in-flight synthesis of `key`, so concurrent misses
+    wait for its body instead of opening their own upstream stream.
     """
-    loop = asyncio.get_event_loop()
-    path = await loop.run_in_executor(_executor, _generate_tts_audio, text)
-    if not path or not os.path.exists(path):
-        raise RuntimeError("Failed to synthesize speech via OpenAI TTS")
-    return path
+    singleflight_stats["upstream_calls"] += 1
+    flight = asyncio.get_running_loop().create_future()
+    _inflight[key] = flight
+
+    def _done(f: asyncio.Future) -> None:
+        if _inflight.get(key) is f:
+            del _inflight[key]
+        if not f.cancelled():
+            f.exception()  # waiters get it through their shield; don't log it as unretrieved
+
+    flight.add_done_callback(_done)
+    return flight
+
+def _land(flight: asyncio.Future, result=None, error: BaseException | None = None) -> None:
+    if flight.done():
+        return
+    if error is None:
+        flight.set_result(result)
+    elif isinstance(error, Exception):
+        flight.set_exception(error)
+    else:
+        flight.cancel()
+
+async def _iter_tts_stream(text: str, fmt: str, ctx, resp, flight: asyncio.Future):
+    parts = []
+    try:
+        async for chunk in resp.iter_bytes(TTS_STREAM_CHUNK_BYTES):
+            parts.append(chunk)
+            yield chunk
+        # Only a fully delivered body is cached or handed to waiters
+        audio = b"".join(parts)
+        tts_cache.put_async(_tts_key(text, fmt), fmt, audio)
+        _land(flight, (audio, True))
+    finally:
+        await ctx.__aexit__(None, None, None)
+        _release_slot()
+        _land(flight, error=TTSUnavailable("TTS stream ended before the audio was complete"))
+
+async def _iter_audio(audio: bytes):
+    yield audio
+
+async def stream_speech(text: str, fmt: str = OPENAI_TTS_FORMAT):
+    """
+    Open an upstream TTS stream and return an async iterator of audio chunks.
+    Errors opening the stream surface here, before any bytes are sent.
+    The pool slot is held until the stream is drained; concurrent callers for the
+    same text get the full body once it has been.
+    """
+    key = _tts_key(text, fmt)
+    pending = _inflight.get(key)
+    if pending is not None:
+        # Someone is already synthesizing this text; wait for it rather than open a second stream
+        singleflight_stats["coalesced"] += 1
+        audio, _ = await _within_deadline(asyncio.shield(pending))
+        return _iter_audio(audio)
+
+    flight = _start_flight(key)
+    try:
+        return await _open_stream(text, fmt, flight)
+    except BaseException as e:
+        _land(flight, error=e)
+        raise
+
+async def _open_stream(text: str, fmt: str, flight: asyncio.Future):
+    primary = _primary()
+    fallback = _fallback()
+
+    async def _open():
+        await _acquire_slot()
+        try:
+            return await primary.open_stream(text, fmt)
+        except BaseException:
+            _release_slot()
+            raise
+
+    if fallback is None:
+        ctx, resp = await _within_deadline(_open())
+        return _iter_tts_stream(text, fmt, ctx, resp, flight)
+
+    # Waiting for a pool slot is queueing, not engine latency: only open_stream is on the budget
+    await _within_deadline(_acquire_slot())
+    try:
+        ctx, resp = await asyncio.wait_for(primary.open_stream(text, fmt), TTS_LATENCY_BUDGET_S)
+    except Exception as e:
+        _release_slot()
+        _note_primary_failure(primary, fallback, e)
+        audio = await _within_deadline(_fallback_audio(fallback, text, fmt))
+        _land(flight, (audio, False))
+        return _iter_audio(audio)
+    except BaseException:
+        _release_slot()
+        raise
+    failover_stats["primary_ok"] += 1
+    return _iter_tts_stream(text, fmt, ctx, resp, flight)
+
+async def _synthesize(key: str, text: str, fmt: str) -> tuple[bytes, bool]:
+    async def _run():
+        await _acquire_slot()
+        try:
+            return await _generate_with_failover(text, fmt)
+        finally:
+            _release_slot()
+
+    audio, backend = await _within_deadline(_run())
+    if not audio:
+        raise RuntimeError(f"Failed to synthesize speech via {backend.name} TTS")
+    from_primary = backend is _primary()
+    if from_primary:
+        tts_cache.put_async(key, fmt, audio)
+    return audio, from_primary
+
+async def _synthesize_once(key: str, text: str, fmt: str) -> tuple[bytes, bool]:
+    """
+    Join an in-flight synthesis of `key`, or start one. Waiters are shielded so a
+    cancelled caller does not cancel the shared call.
+    """
+    task = _inflight.get(key)
+    if task is None:
+        singleflight_stats["upstream_calls"] += 1
+        task = asyncio.ensure_future(_synthesize(key, text, fmt))
+        _inflight[key] = task
+        task.add_done_callback(lambda t: _inflight.pop(key, None) if _inflight.get(key) is t else None)
+    else:
+        singleflight_stats["coalesced"] += 1
+    return await asyncio.shield(task)
+
+async def _speak(text: str, fmt: str) -> tuple[bytes, bool]:
+    """
+    Returns (audio, from_primary); from_primary is False if any part came from the fallback engine.
+    """
+    key = _tts_key(text, fmt)
+    audio = await tts_cache.get_async(key, fmt)
+    if audio is not None:
+        return audio, True
+
+    if _segmented(text, fmt):
+        # Constant segments ('Is that correct?') are cache hits; the rest run concurrently
+        results = await asyncio.gather(*(_speak(seg, fmt) for seg in split_segments(text)))
+        return _splice([a for a, _ in results], fmt), all(p for _, p in results)
+
+    return await _synthesize_once(key, text, fmt)
+
+async def speak_bytes(text: str, fmt: str = OPENAI_TTS_FORMAT) -> bytes:
+    """
+    Cached TTS: memory LRU -> disk tier -> primary backend (failing over to the
+    local engine past TTS_LATENCY_BUDGET_S). Returns audio bytes in `fmt`.
+    """
+    audio, _ = await _speak(text, fmt)
+    return audio
+
+async def speak_clips(clips: list[str], fmt: str, text: str) -> bytes:
+    """
+    Join cached clips into one utterance. `text` is the equivalent sentence, used
+    as-is when the format can't be spliced.
+    """
+    if fmt not in _SPLICEABLE:
+        return await speak_bytes(text, fmt)
+    clip_stats["readbacks"] += 1
+    clip_stats["clips"] += len(clips)
+    clip_stats["clip_misses"] += sum(1 for c in set(clips) if not tts_cache.contains_memory(_tts_key(c, fmt)))
+    parts = await asyncio.gather(*(speak_bytes(c, fmt) for c in clips))
+    return _splice(list(parts), fmt)
+
+async def prewarm(texts: list[str]) -> dict:
+    """
+    Synthesize constant prompts in parallel and pin them in memory.
+    Failures are collected in the report rather than raised.
+    """
+    texts = list(dict.fromkeys(t for t in texts if t))
+    jobs = [(t, fmt) for fmt in TTS_PREWARM_FORMATS for t in texts]
+    started = time.perf_counter()
+    limit = asyncio.Semaphore(max(1, TTS_PREWARM_CONCURRENCY))
+
+    async def _warm(text: str, fmt: str) -> tuple[bytes, bool]:
+        async with limit:
+            return await _speak(text, fmt)
+
+    results = await asyncio.gather(*(_warm(t, fmt) for t, fmt in jobs), return_exceptions=True)
+
+    failed = {}
+    for (text, fmt), result in zip(jobs, results):
+        if isinstance(result, BaseException):
+            failed[f"{fmt}: {text}"] = str(result)
+        elif not result[1]:
+            # Don't pin fallback audio as if it were the primary voice
+            failed[f"{fmt}: {text}"] = f"{TTS_BACKEND} unavailable; only the fallback engine answered"
+        else:
+            tts_cache.pin(_tts_key(text, fmt), result[0])
+
+    prewarm_report.clear()
+    prewarm_report.update({
+        "prompts": len(jobs),
+        "ok": len(jobs) - len(failed),
+        "failed": failed,
+        "seconds": round(time.perf_counter() - started, 3),
+    })
+    return prewarm_report
+
+def pool_snapshot() -> dict:
+    done = pool_stats["completed"]
+    return {
+        **pool_stats,
+        "wait_seconds_avg": round(pool_stats["wait_seconds_total"] / done, 4) if done else None,
+    }
@@ -0,0 +1,153 @@
+# app/utils/tts_backends.py
+import os
+import asyncio
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from app.utils.openai_client import get_async_client
+
+try:
+    import ffmpeg  # ffmpeg-python, for transcoding local engine output
+except ImportError:  # pragma: no cover - optional
+    ffmpeg = None
+
+# Use a model you have access to — switching to tts-1
+OPENAI_TTS_MODEL = os.getenv("OPENAI_TTS_MODEL", "tts-1")
+OPENAI_TTS_VOICE = os.getenv("OPENAI_TTS_VOICE", "alloy")  # alloy, verse, shimmer
+
+LOCAL_TTS_RATE = int(os.getenv("LOCAL_TTS_RATE", "175"))  # words per minute
+LOCAL_TTS_VOICE = os.getenv("LOCAL_TTS_VOICE", "")  # engine voice id; empty = system default
+
+# ffmpeg output args per OpenAI response_format, so local audio matches what clients negotiated
+_FFMPEG_OUTPUT = {
+    "mp3": {"format": "mp3", "acodec": "libmp3lame", "audio_bitrate": "64k"},
+    "opus": {"format": "ogg", "acodec": "libopus", "audio_bitrate": "32k"},
+    "aac": {"format": "adts", "acodec": "aac", "audio_bitrate": "64k"},
+    "flac": {"format": "flac"},
+    "wav": {"format": "wav"},
+    "pcm": {"format": "s16le", "acodec": "pcm_s16le", "ar": 24000, "ac": 1},
+}
+
+
+class TTSBackend:
+    """
+    A speech engine behind speak_bytes. `cache_model`/`cache_voice` make the
+    cache key engine-specific so audio from one engine is never served as another's.
+    """
+    name = "base"
+    cache_model = ""
+    cache_voice = ""
+    supports_streaming = False
+
+    async def synthesize(self, text: str, fmt: str) -> bytes:
+        raise NotImplementedError
+
+    async def open_stream(self, text: str, fmt: str):
+        """
+        Returns (context manager, response) with an `iter_bytes(chunk_size)` async iterator.
+        """
+        raise NotImplementedError
+
+
+class OpenAITTSBackend(TTSBackend):
+    name = "openai"
+    cache_model = OPENAI_TTS_MODEL
+    cache_voice = OPENAI_TTS_VOICE
+    supports_streaming = True
+
+    def _request(self, text: str, fmt: str):
+        return get_async_client().audio.speech.with_streaming_response.create(
+            model=OPENAI_TTS_MODEL,
+            voice=OPENAI_TTS_VOICE,
+            input=text,
+            response_format=fmt,
+        )
+
+    async def synthesize(self, text: str, fmt: str) -> bytes:
+        async with self._request(text, fmt) as resp:
+            return await resp.read()
+
+    async def open_stream(self, text: str, fmt: str):
+        ctx = self._request(text, fmt)
+        return ctx, await ctx.__aenter__()
+
+
+class Pyttsx3Backend(TTSBackend):
+    """
+    On-box engine (SAPI5 / NSSpeechSynthesizer / eSpeak via pyttsx3). The engine is
+    not thread-safe, so it lives on a single dedicated thread.
+    """
+    name = "local"
+    cache_model = "pyttsx3"
+    cache_voice = LOCAL_TTS_VOICE or "default"
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts-local")
+        self._engine_instance = None
+
+    def _engine(self):
+        # Only ever called on the executor's single thread
+        engine = self._engine_instance
+        if engine is None:
+            import pyttsx3
+
+            engine = pyttsx3.init()
+            engine.setProperty("rate", LOCAL_TTS_RATE)
+            if LOCAL_TTS_VOICE:
+                engine.setProperty("voice", LOCAL_TTS_VOICE)
+            self._engine_instance = engine
+        return engine
+
+    def _render(self, text: str, fmt: str) -> bytes:
+        engine = self._engine()
+        fd, path = tempfile.mkstemp(suffix=".wav", prefix="tts_local_")
+        os.close(fd)
+        try:
+            engine.save_to_file(text, path)
+            engine.runAndWait()
+            with open(path, "rb") as f:
+                raw = f.read()
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        if not raw:
+            raise RuntimeError("Local TTS engine produced no audio")
+        return _transcode(raw, fmt)
+
+    async def synthesize(self, text: str, fmt: str) -> bytes:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._executor, self._render, text, fmt)
+
+
+def _transcode(raw: bytes, fmt: str) -> bytes:
+    """
+    Convert the engine's native output (WAV, or AIFF on macOS) into `fmt`.
+    """
+    if fmt == "wav" and raw[:4] == b"RIFF":
+        return raw
+    if ffmpeg is None:
+        raise RuntimeError(f"ffmpeg-python is required to produce {fmt!r} from the local TTS engine")
+    out, _ = (
+        ffmpeg.input("pipe:0")
+        .output("pipe:1", **_FFMPEG_OUTPUT[fmt])
+        .run(input=raw, capture_stdout=True, quiet=True)
+    )
+    return out
+
+
+_BACKENDS = {
+    "openai": OpenAITTSBackend,
+    "local": Pyttsx3Backend,
+}
+_instances: dict[str, TTSBackend] = {}
+
+
+def get_backend(name: str) -> TTSBackend:
+    if name not in _BACKENDS:
+        raise ValueError(f"Unknown TTS backend {name!r}; choose one of {', '.join(_BACKENDS)}")
+    backend = _instances.get(name)
+    if backend is None:
+        backend = _instances[name] = _BACKENDS[name]()
+    return backend
@@ -0,0 +1,245 @@
+# app/utils/tts_cache.py
+import os
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+APP_DIR = os.path.dirname(os.path.dirname(__file__))  # .../app
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join(APP_DIR, "tts_cache"))
+
+# In-memory tier: bounded by entry count and total bytes
+TTS_CACHE_MEMORY_ITEMS = int(os.getenv("TTS_CACHE_MEMORY_ITEMS", "512"))
+TTS_CACHE_MEMORY_BYTES = int(os.getenv("TTS_CACHE_MEMORY_BYTES", str(64 * 1024 * 1024)))
+# On-disk tier: bounded by total bytes (0 disables the disk tier).
+# AUDIO_IN_MEMORY=1 keeps the request path off the filesystem, so the tier defaults to off.
+AUDIO_IN_MEMORY = os.getenv("AUDIO_IN_MEMORY", "0") == "1"
+TTS_CACHE_DISK_BYTES = int(os.getenv(
+    "TTS_CACHE_DISK_BYTES", "0" if AUDIO_IN_MEMORY else str(512 * 1024 * 1024)
+))
+
+
+def cache_key(model: str, voice: str, fmt: str, text: str) -> str:
+    """
+    Content address for a synthesized utterance: (model, voice, format, sha256(text)).
+    """
+    text_hash = hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{model}\0{voice}\0{fmt}\0{text_hash}".encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    """
+    Two-tier audio cache: an LRU dict of bytes in front of a size-capped directory.
+    Disk entries are named '<key>.<fmt>'. An in-memory index (path -> size, in LRU
+    order) is seeded from the directory once, so trimming never rescans it.
+    On the event loop use get_async()/put_async(): disk reads run in a thread and
+    disk writes happen behind the caller.
+    """
+
+    def __init__(self, directory: str, memory_items: int, memory_bytes: int, disk_bytes: int):
+        self.directory = directory
+        self.memory_items = memory_items
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_size = 0
+        self._pinned: dict[str, bytes] = {}
+        self._disk_index: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_size = 0
+        self._writes: set[asyncio.Task] = set()
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+        }
+        if self.disk_bytes > 0:
+            os.makedirs(self.directory, exist_ok=True)
+            for path, size, _ in sorted(self._disk_entries(), key=lambda e: e[2]):
+                self._disk_index[path] = size
+                self._disk_size += size
+
+    # ---------- memory tier ----------
+
+    def _remember(self, key: str, data: bytes) -> None:
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_size -= len(old)
+        if len(data) > self.memory_bytes:
+            return
+        self._memory[key] = data
+        self._memory_size += len(data)
+        while self._memory and (
+            len(self._memory) > self.memory_items or self._memory_size > self.memory_bytes
+        ):
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+            self.stats["memory_evictions"] += 1
+
+    def pin(self, key: str, data: bytes) -> None:
+        """
+        Keep an entry resident regardless of LRU pressure (startup prompts).
+        """
+        with self._lock:
+            self._pinned[key] = data
+
+    def contains_memory(self, key: str) -> bool:
+        """
+        Residency check that leaves hit counters and LRU order alone.
+        """
+        with self._lock:
+            return key in self._pinned or key in self._memory
+
+    def contains(self, key: str, fmt: str) -> bool:
+        """
+        Either tier, without counting a hit or miss. Disk residency comes from the index,
+        so this never touches the filesystem.
+        """
+        if self.contains_memory(key):
+            return True
+        with self._lock:
+            return self._disk_path(key, fmt) in self._disk_index
+
+    def get_memory(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._pinned.get(key)
+            if data is not None:
+                self.stats["memory_hits"] += 1
+                return data
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+            return data
+
+    # ---------- disk tier ----------
+
+    def _disk_path(self, key: str, fmt: str) -> str:
+        return os.path.join(self.directory, f"{key}.{fmt}")
+
+    def _disk_entries(self):
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.is_file() and not entry.name.endswith(".tmp"):
+                        st = entry.stat()
+                        yield entry.path, st.st_size, st.st_mtime
+        except FileNotFoundError:
+            return
+
+    def _index_disk(self, path: str, size: int) -> None:
+        # Caller holds the lock; an overwrite replaces the old size rather than adding to it
+        self._disk_size -= self._disk_index.pop(path, 0)
+        self._disk_index[path] = size
+        self._disk_size += size
+
+    def _trim_disk(self) -> None:
+        while self._disk_size > self.disk_bytes and self._disk_index:
+            path, size = self._disk_index.popitem(last=False)
+            self._disk_size -= size
+            try:
+                os.remove(path)
+                self.stats["disk_evictions"] += 1
+            except OSError:
+                pass  # already gone (another worker, or the file was removed by hand)
+
+    def _miss(self) -> None:
+        with self._lock:
+            self.stats["misses"] += 1
+
+    def get(self, key: str, fmt: str) -> Optional[bytes]:
+        data = self.get_memory(key)
+        if data is not None:
+            return data
+        if self.disk_bytes <= 0:
+            self._miss()
+            return None
+        return self._read_disk(key, fmt)
+
+    async def get_async(self, key: str, fmt: str) -> Optional[bytes]:
+        data = self.get_memory(key)
+        if data is not None:
+            return data
+        if self.disk_bytes <= 0:
+            self._miss()
+            return None
+        return await asyncio.to_thread(self._read_disk, key, fmt)
+
+    def _read_disk(self, key: str, fmt: str) -> Optional[bytes]:
+        path = self._disk_path(key, fmt)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.stats["misses"] += 1
+                self._disk_size -= self._disk_index.pop(path, 0)
+            return None
+
+        with self._lock:
+            self.stats["disk_hits"] += 1
+            self._index_disk(path, len(data))
+            self._remember(key, data)
+        return data
+
+    def put(self, key: str, fmt: str, data: bytes) -> None:
+        if not data:
+            return
+        with self._lock:
+            self._remember(key, data)
+        if self.disk_bytes > 0:
+            self._write_disk(key, fmt, data)
+
+    def put_async(self, key: str, fmt: str, data: bytes) -> None:
+        """
+        Memory now, disk in a background thread (write-behind); call from the event loop.
+        """
+        if not data:
+            return
+        with self._lock:
+            self._remember(key, data)
+        if self.disk_bytes > 0:
+            task = asyncio.ensure_future(asyncio.to_thread(self._write_disk, key, fmt, data))
+            self._writes.add(task)
+            task.add_done_callback(self._writes.discard)
+
+    def _write_disk(self, key: str, fmt: str, data: bytes) -> None:
+        path = self._disk_path(key, fmt)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"TTS cache write failed: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            self._index_disk(path, len(data))
+            self._trim_disk()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                **self.stats,
+                "memory_items": len(self._memory),
+                "pinned_items": len(self._pinned),
+                "memory_bytes": self._memory_size,
+                "disk_bytes": self._disk_size,
+            }
+
+
+tts_cache = TTSCache(
+    TTS_CACHE_DIR,
+    memory_items=TTS_CACHE_MEMORY_ITEMS,
+    memory_bytes=TTS_CACHE_MEMORY_BYTES,
+    disk_bytes=TTS_CACHE_DISK_BYTES,
+)
@@ -1,17 +1,213 @@
 # app/utils/whisper_stt.py
 import os
-from openai import OpenAI
+import time
+import asyncio
+from collections import deque
+from typing import BinaryIO
+
+from app.utils.openai_client import get_async_client, get_client
+
+# "openai" (hosted Whisper API) or "local" (on-box Whisper, see local_whisper.py)
+STT_BACKEND = os.getenv("STT_BACKEND", "openai")
+# Per-call budget for the async path; on expiry the upstream request is cancelled
+STT_TIMEOUT_S = float(os.getenv("STT_TIMEOUT_S", "20"))
+
+# Opt-in hedging: if a request outlives the rolling latency percentile, race a duplicate
+STT_HEDGE = os.getenv("STT_HEDGE", "0") == "1"
+STT_HEDGE_PERCENTILE = float(os.getenv("STT_HEDGE_PERCENTILE", "95"))
+STT_HEDGE_MIN_S = float(os.getenv("STT_HEDGE_MIN_S", "1.0"))  # never hedge sooner than this
+STT_HEDGE_WINDOW = int(os.getenv("STT_HEDGE_WINDOW", "200"))
+STT_HEDGE_MIN_SAMPLES = int(os.getenv("STT_HEDGE_MIN_SAMPLES", "20"))
+
+_latencies: deque[float] = deque(maxlen=STT_HEDGE_WINDOW)
+# Calls the primary answered itself (hedge wins left out), for a p99 without the rescue
+_unhedged_latencies: deque[float] = deque(maxlen=STT_HEDGE_WINDOW)
+
+hedge_stats = {
+    "requests": 0,
+    "hedged": 0,
+    "hedge_won": 0,
+    "primary_won": 0,
+    "hedged_seconds_total": 0.0,
+    # Tail removed by hedge wins, as a lower bound: the beaten primary's age when
+    # cancelled minus the winning hedge's own latency
+    "saved_seconds_total": 0.0,
+    "saved_seconds_max": 0.0,
+    "saved_lower_bounds": 0,
+}
+
+class STTTimeout(Exception):
+    pass
+
+def _upload_part(audio: str | bytes | BinaryIO, filename: str | None, content_type: str | None):
+    """
+    Build the multipart `file` value: (name, content[, mime]). Paths are opened by the caller.
+    """
+    if isinstance(audio, (bytes, bytearray, memoryview)):
+        content = bytes(audio)
+    else:
+        content = audio
+        if hasattr(audio, "seek"):
+            audio.seek(0)
+    name = filename or os.path.basename(getattr(audio, "name", "") or "") or "user.webm"
+    return (name, content, content_type) if content_type else (name, content)
+
+def transcribe_with_openai(
+    audio: str | bytes | BinaryIO,
+    filename: str | None = None,
+    content_type: str | None = None,
+):
+    """
+    Transcribes audio to text using the OpenAI Whisper API.
+    `audio` is a file path, raw bytes, or a readable file-like object (e.g. the upload's
+    spooled buffer); for the latter two `filename`/`content_type` carry the container hint.
+    """
+    try:
+        client = get_client()
+
+        if isinstance(audio, str):
+            with open(audio, "rb") as audio_file:
+                transcript = client.audio.transcriptions.create(
+                    model="whisper-1",
+                    file=audio_file
+                )
+                return transcript.text
+
+        transcript = client.audio.transcriptions.create(
+            model="whisper-1",
+            file=_upload_part(audio, filename, content_type)
+        )
+        return transcript.text
+    except Exception as e:
+        raise Exception(f"OpenAI transcription error: {e}")
+
+async def transcribe_async(
+    audio: str | bytes | BinaryIO,
+    filename: str | None = None,
+    content_type: str | None = None,
+    timeout: float | None = STT_TIMEOUT_S,
+    pcm: bytes | None = None,
+    prompt: str | None = None,
+) -> str:
+    """
+    Non-blocking transcription on the shared async client. Cancelling the caller
+    (or hitting `timeout`) cancels the upstream request.
+    With STT_BACKEND=local, `pcm` (16 kHz mono s16le from audio_prep) goes to the on-box model instead.
+    `prompt` is a vocabulary hint (Whisper's `prompt` / `initial_prompt`).
+    """
+    if STT_BACKEND == "local":
+        return await _transcribe_local(pcm, timeout, prompt)
+
+    client = get_async_client()
+    if isinstance(audio, str):
+        with open(audio, "rb") as f:
+            audio = f.read()
+    elif STT_HEDGE and not isinstance(audio, (bytes, bytearray, memoryview)):
+        audio = audio.read()  # a hedge needs its own copy of the body
+
+    def request():
+        return client.audio.transcriptions.create(
+            model="whisper-1",
+            file=_upload_part(audio, filename, content_type),
+            **({"prompt": prompt} if prompt else {}),
+        )
 
-def transcribe_with_openai(file_path: str):
-    """Transcribes an audio file to text using the OpenAI Whisper API."""
     try:
-        client = OpenAI()
-        
-        with open(file_path, "rb") as audio_file:
-            transcript = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file
-            )
-            return transcript.text
+        if STT_HEDGE:
+            transcript = await asyncio.wait_for(_hedged(request), timeout)
+        else:
+            started = time.perf_counter()
+            transcript = await asyncio.wait_for(request(), timeout)
+            elapsed = time.perf_counter() - started
+            _latencies.append(elapsed)  # baseline for p99 and a warm threshold
+            _unhedged_latencies.append(elapsed)
+        return transcript.text
+    except asyncio.TimeoutError:
+        raise STTTimeout(f"OpenAI transcription timed out after {timeout}s")
     except Exception as e:
         raise Exception(f"OpenAI transcription error: {e}")
+
+
+async def _transcribe_local(pcm: bytes | None, timeout: float | None, prompt: str | None = None) -> str:
+    from app.utils.local_whisper import transcribe_local
+
+    if pcm is None:
+        raise Exception("Local transcription error: audio could not be decoded to PCM")
+    try:
+        return await asyncio.wait_for(transcribe_local(pcm, prompt), timeout)
+    except asyncio.TimeoutError:
+        raise STTTimeout(f"Local transcription timed out after {timeout}s")
+    except Exception as e:
+        raise Exception(f"Local transcription error: {e}")
+
+
+def _hedge_threshold() -> float | None:
+    if len(_latencies) < STT_HEDGE_MIN_SAMPLES:
+        return None
+    ordered = sorted(_latencies)
+    index = min(len(ordered) - 1, int(len(ordered) * STT_HEDGE_PERCENTILE / 100))
+    return max(STT_HEDGE_MIN_S, ordered[index])
+
+
+async def _hedged(request):
+    """
+    Run `request()`; if it hasn't answered by the hedge threshold, start a second
+    identical one. The first to succeed wins and the other is cancelled.
+    """
+    started = time.perf_counter()
+    hedge_stats["requests"] += 1
+    threshold = _hedge_threshold()
+    primary = asyncio.ensure_future(request())
+    tasks = {primary}
+    hedge_started = None
+    winner = None
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=threshold)
+        hedged = not done
+        if hedged:
+            hedge_stats["hedged"] += 1
+            hedge_started = time.perf_counter()
+            tasks.add(asyncio.ensure_future(request()))
+        while True:
+            done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            winner = next((t for t in done if t.exception() is None), None)
+            if winner is not None or not pending:
+                break
+            tasks = pending  # one attempt failed; the other may still answer
+        if winner is None:
+            raise next(iter(done)).exception()
+
+        won_at = time.perf_counter()
+        elapsed = won_at - started
+        _latencies.append(elapsed)
+        if hedged:
+            hedge_stats["hedge_won" if winner is not primary else "primary_won"] += 1
+            hedge_stats["hedged_seconds_total"] += elapsed
+        if winner is primary:
+            _unhedged_latencies.append(elapsed)
+        return winner.result()
+    finally:
+        for task in tasks | {primary}:
+            task.cancel()
+        if hedge_started is not None and winner is not None and winner is not primary:
+            # The primary would have taken at least its age at cancellation
+            saved = (time.perf_counter() - started) - (won_at - hedge_started)
+            hedge_stats["saved_lower_bounds"] += 1
+            hedge_stats["saved_seconds_total"] += saved
+            hedge_stats["saved_seconds_max"] = max(hedge_stats["saved_seconds_max"], round(saved, 3))
+
+
+def _percentile(samples, pct: float) -> float | None:
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))], 3) if ordered else None
+
+
+def hedge_snapshot() -> dict:
+    snap = dict(hedge_stats)
+    snap["saved_seconds_total"] = round(snap["saved_seconds_total"], 3)
+    snap["threshold_s"] = _hedge_threshold()
+    snap["p50_s"] = _percentile(_latencies, 50)
+    snap["p99_s"] = _percentile(_latencies, 99)
+    # Calls the primary answered itself; the gap to p99_s is the tail hedging rescued
+    snap["p99_without_hedge_wins_s"] = _percentile(_unhedged_latencies, 99)
+    return snap
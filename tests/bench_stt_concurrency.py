@@ -0,0 +1,71 @@
+# tests/bench_stt_concurrency.py
+"""
+Turns per second for N concurrent transcriptions against the stand-in STT server.
+
+    python -m tests.bench_stt_concurrency --turns 64 --delay 0.5
+
+Runs the same batch three ways:
+  async      transcribe_async on the shared AsyncOpenAI client (the current path)
+  to_thread  transcribe_with_openai in the default thread pool (the path it replaced)
+  blocking   transcribe_with_openai called straight from the event loop
+Both clients share OPENAI_MAX_CONNECTIONS, so raise --connections to see the async
+path past the pool size; the thread path is also capped by the default executor.
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from tests.stt_standin import STTStandin
+
+AUDIO = b"\0" * 3200  # the stand-in ignores the body; keep uploads small and equal
+
+
+async def _batch(mode: str, turns: int) -> float:
+    from app.utils.whisper_stt import transcribe_async, transcribe_with_openai
+
+    async def one() -> str:
+        if mode == "async":
+            return await transcribe_async(AUDIO, filename="turn.wav", content_type="audio/wav")
+        if mode == "to_thread":
+            return await asyncio.to_thread(transcribe_with_openai, AUDIO, "turn.wav", "audio/wav")
+        return transcribe_with_openai(AUDIO, "turn.wav", "audio/wav")
+
+    await one()  # warm the connection pool outside the measurement
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(turns)))
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=64, help="concurrent transcriptions per run")
+    parser.add_argument("--delay", type=float, default=0.5, help="stand-in latency per request, seconds")
+    parser.add_argument("--connections", type=int, default=64, help="OPENAI_MAX_CONNECTIONS for both clients")
+    parser.add_argument("--modes", default="async,to_thread,blocking")
+    args = parser.parse_args()
+
+    server = STTStandin(args.delay).start()
+    os.environ.update({
+        "OPENAI_BASE_URL": server.base_url,
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "bench"),
+        "OPENAI_MAX_CONNECTIONS": str(args.connections),
+        "OPENAI_MAX_KEEPALIVE": str(args.connections),
+        "STT_BACKEND": "openai",
+        "STT_HEDGE": "0",
+    })
+    try:
+        print(f"{args.turns} concurrent turns, {args.delay}s per transcription, {args.connections} connections")
+        print(f"{'mode':10} {'seconds':>8} {'turns/s':>8}")
+        for mode in args.modes.split(","):
+            from app.utils import openai_client
+
+            openai_client._clients.clear()  # a fresh async client per event loop
+            seconds = asyncio.run(_batch(mode, args.turns))
+            print(f"{mode:10} {seconds:8.2f} {args.turns / seconds:8.1f}")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
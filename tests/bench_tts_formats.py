@@ -0,0 +1,82 @@
+# tests/bench_tts_formats.py
+"""
+Payload size and time-to-play per TTS output format.
+
+    python -m tests.bench_tts_formats                  # on-box engine, no network
+    python -m tests.bench_tts_formats --backend openai --repeat 3
+
+Synthesizes a fixed prompt set through speak_bytes for every format in TTS_FORMATS
+with the cache off, and reports median bytes, time-to-first-byte and time-to-complete.
+speak_bytes answers in one piece, so its first byte is its last; with a streaming
+backend the same prompts are also sent through stream_speech for a real first-byte time.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+PROMPTS = [
+    "Hello! I can help you book an appointment. What's your full name?",
+    "Thanks. What's the best email address to send the confirmation to?",
+    "Is that correct?",
+    "What date would you like to come in?",
+    "Your appointment is booked. You'll receive a confirmation by email shortly. Anything else I can help with?",
+]
+
+
+async def _measure(tts, fmt: str, text: str, stream: bool) -> tuple[int, float, float]:
+    started = time.perf_counter()
+    if not stream:
+        audio = await tts.speak_bytes(text, fmt)
+        done = time.perf_counter() - started
+        return len(audio), done, done
+    first = None
+    size = 0
+    async for chunk in await tts.stream_speech(text, fmt):
+        if first is None:
+            first = time.perf_counter() - started
+        size += len(chunk)
+    return size, first or 0.0, time.perf_counter() - started
+
+
+async def run(repeat: int) -> list[dict]:
+    from app.utils import tts
+
+    streaming = tts._primary().supports_streaming
+    modes = [("speak_bytes", False)] + ([("stream_speech", True)] if streaming else [])
+    rows = []
+    for fmt in tts.TTS_FORMATS:
+        for mode, stream in modes:
+            samples = [await _measure(tts, fmt, text, stream) for _ in range(repeat) for text in PROMPTS]
+            rows.append({
+                "format": fmt,
+                "path": mode,
+                "bytes": int(statistics.median(s[0] for s in samples)),
+                "ttfb_ms": round(statistics.median(s[1] for s in samples) * 1000, 1),
+                "complete_ms": round(statistics.median(s[2] for s in samples) * 1000, 1),
+            })
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", default="local", help="TTS_BACKEND to measure (local | openai)")
+    parser.add_argument("--repeat", type=int, default=1, help="passes over the prompt set per format")
+    args = parser.parse_args()
+
+    # Every call must reach the engine: no cache tiers, no failover to a different voice
+    os.environ.update({
+        "TTS_BACKEND": args.backend,
+        "TTS_FALLBACK_BACKEND": "",
+        "TTS_CACHE_MEMORY_ITEMS": "0",
+        "TTS_CACHE_DISK_BYTES": "0",
+    })
+    rows = asyncio.run(run(args.repeat))
+    print(f"{'format':8} {'path':14} {'bytes':>9} {'ttfb_ms':>9} {'complete_ms':>12}")
+    for row in rows:
+        print(f"{row['format']:8} {row['path']:14} {row['bytes']:>9} {row['ttfb_ms']:>9} {row['complete_ms']:>12}")
+
+
+if __name__ == "__main__":
+    main()
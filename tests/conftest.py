@@ -0,0 +1,20 @@
+# tests/conftest.py
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stt_standin import STTStandin  # noqa: E402
+
+
+@pytest.fixture
+def stt_standin():
+    """
+    A local transcription server with injected delay; push per-request delays onto `.delays`.
+    """
+    server = STTStandin().start()
+    yield server
+    server.stop()
@@ -0,0 +1,101 @@
+# tests/stt_standin.py
+"""
+Stand-in for the hosted transcription endpoint, with injected delay.
+
+Point the app (or a test) at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+Each request to /v1/audio/transcriptions sleeps for the next entry of `delays`
+(or `default_delay_s` once they run out) and answers {"text": ...}.
+
+    python tests/stt_standin.py --port 8765 --delay 0.3 --slow-every 10 --slow-delay 3
+"""
+import argparse
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256  # the default backlog of 5 refuses bursts of concurrent turns
+
+
+class STTStandin:
+    def __init__(self, default_delay_s: float = 0.0, text: str = "stand-in transcript",
+                 slow_every: int = 0, slow_delay_s: float = 0.0, port: int = 0):
+        self.default_delay_s = default_delay_s
+        self.text = text
+        self.slow_every = slow_every
+        self.slow_delay_s = slow_delay_s
+        self.delays: deque[float] = deque()
+        self.requests = 0
+        self.completed = 0
+        self._lock = threading.Lock()
+        self._server = _Server(("127.0.0.1", port), self._handler())
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _next_delay(self) -> float:
+        with self._lock:
+            self.requests += 1
+            if self.delays:
+                return self.delays.popleft()
+            if self.slow_every and self.requests % self.slow_every == 0:
+                return self.slow_delay_s
+            return self.default_delay_s
+
+    def _handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if not self.path.rstrip("/").endswith("/audio/transcriptions"):
+                    self.send_error(404)
+                    return
+                time.sleep(standin._next_delay())
+                body = json.dumps({"text": standin.text}).encode()
+                try:
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client cancelled (e.g. a hedge lost)
+                with standin._lock:
+                    standin.completed += 1
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "STTStandin":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=0.3, help="seconds per request")
+    parser.add_argument("--slow-every", type=int, default=0, help="make every Nth request slow")
+    parser.add_argument("--slow-delay", type=float, default=3.0, help="seconds for the slow requests")
+    args = parser.parse_args()
+    server = STTStandin(args.delay, slow_every=args.slow_every, slow_delay_s=args.slow_delay, port=args.port)
+    print(f"Stand-in STT on {server.base_url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
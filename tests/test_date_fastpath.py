@@ -0,0 +1,132 @@
+# tests/test_date_fastpath.py
+"""
+The date fast path must agree with dateparser wherever both produce a date, and must
+stay silent on phrases that only look like dates. `python -m tests.test_date_fastpath`
+runs the benchmark.
+"""
+import datetime
+import random
+import timeit
+
+import pytest
+
+pytest.importorskip("dateparser")
+pytest.importorskip("openai")
+
+from app.utils import nlp  # noqa: E402
+
+NOW = datetime.datetime(2026, 10, 16, 10, 0)
+
+_MONTHS = ["january", "february", "march", "april", "may", "june", "july", "august",
+           "september", "october", "november", "december"]
+_ABBREVIATIONS = {1: "jan", 2: "feb", 3: "mar", 4: "apr", 6: "jun", 8: "aug", 9: "sept", 10: "oct", 11: "nov", 12: "dec"}
+_SUFFIX = {1: "st", 2: "nd", 3: "rd", 21: "st", 22: "nd", 23: "rd"}
+_COUNTS = ["one", "two", "three", "four", "five", "six"]
+_FRAMES = ["{}", "{} at 3pm"]  # whole phrases, which is what dateparser.parse (not search_dates) reads
+
+
+def _date_phrases(rng: random.Random) -> str:
+    month = rng.randint(1, 12)
+    day = rng.randint(1, 28)
+    if (month, day) == (NOW.month, NOW.day):
+        day += 1  # a same-day date is kept by the fast path but rolled a week by _ensure_future
+    name = _MONTHS[month - 1]
+    nth = f"{day}{_SUFFIX.get(day, 'th')}"
+    year = rng.choice(["", " 2027", ", 2028"])
+    return rng.choice([
+        f"{day} {name}{year}",
+        f"{nth} of {name}{year}",
+        f"the {nth} of {name}",
+        f"{name} {nth}{year}",
+        f"{name} the {nth}",
+        f"{day} {_ABBREVIATIONS.get(month, name)}",
+        f"{13 + day % 15}/{month:02d}",
+        f"{month}/{13 + day % 15}/2027",
+        f"2027-{month:02d}-{day:02d}",
+        f"in {rng.randint(1, 20)} days",
+        f"in {rng.choice(_COUNTS)} weeks",
+    ])
+
+
+def _corpus(count: int, seed: int = 25) -> list[str]:
+    rng = random.Random(seed)
+    return [rng.choice(_FRAMES).format(_date_phrases(rng)) for _ in range(count)]
+
+
+NOT_DATES = [
+    "I can come at 10 may be later",
+    "at 4 may be better",
+    "the second week of november",
+    "the first weekend of june",
+    "the second one please",
+    "the third option",
+    "the first half of march",
+    "the first available appointment",
+    "the first available slot please",
+    "maybe the first thing in the morning",
+]
+
+
+@pytest.fixture
+def frozen_now(monkeypatch):
+    monkeypatch.setattr(nlp, "_now", lambda: NOW)
+
+
+def _with_dateparser_only(monkeypatch, text: str):
+    with monkeypatch.context() as m:
+        m.setattr(nlp, "_fast_parse_date", lambda _: None)
+        return nlp._parse_date_time(text)[0]
+
+
+def test_agrees_with_dateparser(frozen_now, monkeypatch):
+    compared = 0
+    disagreements = []
+    for text in _corpus(400):
+        slow = _with_dateparser_only(monkeypatch, text)
+        if slow is None:
+            continue  # dateparser can't read it; only the fast path answers
+        compared += 1
+        fast = nlp._parse_date_time(text)[0]
+        if fast != slow:
+            disagreements.append((text, fast, slow))
+    assert compared
+    assert disagreements == []
+
+
+@pytest.mark.parametrize("text", NOT_DATES)
+def test_rejects_non_dates(frozen_now, text):
+    assert nlp._fast_parse_date(text) is None
+
+
+@pytest.mark.parametrize("text,expected", [
+    ("10 may", datetime.date(2027, 5, 10)),
+    ("10 may at 3pm", datetime.date(2027, 5, 10)),
+    ("may 10th", datetime.date(2027, 5, 10)),
+    ("the second of november", datetime.date(2026, 11, 2)),
+    ("the 21st please", datetime.date(2026, 10, 21)),
+    ("the 21st at 3pm", datetime.date(2026, 10, 21)),
+    ("the 21st, then", datetime.date(2026, 10, 21)),
+    ("in a fortnight", datetime.date(2026, 10, 30)),
+])
+def test_fast_path_dates(frozen_now, text, expected):
+    assert nlp._fast_parse_date(text) == expected
+
+
+def benchmark(count: int = 300, number: int = 3) -> dict:
+    """
+    Milliseconds per phrase: full date resolution with and without the fast path.
+    """
+    import unittest.mock
+
+    texts = _corpus(count)
+    with unittest.mock.patch.object(nlp, "_now", lambda: NOW):
+        fast = min(timeit.repeat(lambda: [nlp._parse_date_time(t) for t in texts], number=number, repeat=3))
+        with unittest.mock.patch.object(nlp, "_fast_parse_date", lambda _: None):
+            slow = min(timeit.repeat(lambda: [nlp._parse_date_time(t) for t in texts], number=number, repeat=3))
+    per_call = number * len(texts)
+    return {"fast_path_ms": round(fast / per_call * 1000, 4), "dateparser_ms": round(slow / per_call * 1000, 4)}
+
+
+if __name__ == "__main__":
+    for key, ms in benchmark().items():
+        print(f"{key:16} {ms:8.4f} ms/phrase")
@@ -0,0 +1,97 @@
+# tests/test_nlp_normalize.py
+"""
+Regression corpus for the single-pass spoken-email normaliser, checked against the
+chained re.sub version it replaced. `python -m tests.test_nlp_normalize` runs the
+micro-benchmark.
+"""
+import random
+import re
+import timeit
+
+import pytest
+
+pytest.importorskip("dateparser")
+pytest.importorskip("openai")
+
+from app.utils.nlp import _extract_email, _normalize_spoken_tokens  # noqa: E402
+
+
+def _legacy_normalize(text: str) -> str:
+    # The pre-single-pass implementation, kept verbatim as the reference
+    t = (text or "").lower()
+    t = re.sub(r"\b(my\s+email\s+is|email\s+is|email\s*address\s*is|the\s+email\s+is|it\s+is|it's)\b[:,\.\s]*", " ", t)
+    t = re.sub(r"\bunderscore\b", "_", t)
+    t = re.sub(r"\bhyphen\b", "-", t)
+    t = re.sub(r"\bdash\b", "-", t)
+    t = re.sub(r"\bperiod\b", ".", t)
+    t = re.sub(r"\bdot\b", ".", t)
+    t = re.sub(r"\bat\b", "@", t)
+    t = re.sub(r"\s*@\s*", "@", t)
+    t = re.sub(r"\s*\.\s*", ".", t)
+    t = re.sub(r"(?<=@)\s+", "", t)
+    t = re.sub(r"\s+(?=\.)", "", t)
+    t = re.sub(r"(?<=\.)\s+", "", t)
+    return t.strip()
+
+
+CORPUS = [
+    ("my email is john dot smith at gmail dot com", "john.smith@gmail.com"),
+    ("it is ali@outlook.com", "ali@outlook.com"),
+    ("aliatdomain.com", "aliatdomain.com"),
+    ("j underscore doe hyphen x at example dot co dot uk", "j _ doe - x@example.co.uk"),
+    ("", ""),
+    ("   ", ""),
+    ("email address is: a . b @ c . d", "a.b@c.d"),
+    ("It's Mary dash Jane at Yahoo dot co dot UK", "mary - jane@yahoo.co.uk"),
+    ("my email is cat at dotcom dot com", "cat@dotcom.com"),
+    ("what is it at . x", "what is it@.x"),
+    ("email is  a   at   b  dot  c", "a@b.c"),
+    ("the email is: bob @ mail . example . org please", "bob@mail.example.org please"),
+]
+
+_WORDS = [
+    "my email is", "email is", "email address is", "the email is", "it is", "it's", "underscore", "hyphen",
+    "dash", "period", "dot", "at", "john", "smith", "gmail", "com", "co", "uk", "cat", "dotcom", "at.", "@", ".",
+    " . ", "Ali", "x_at", "IT IS", "Dot", ":", ",", "  ", "\t", "2024", "at@", "-at-", "it is.", "email", "is",
+]
+_SEPARATORS = [" ", "  ", "", " , ", ".", "\t", " . "]
+
+
+def _generated(count: int, seed: int = 7) -> list[str]:
+    rng = random.Random(seed)
+    return [
+        "".join(rng.choice(_WORDS) + rng.choice(_SEPARATORS) for _ in range(rng.randint(1, 12)))
+        for _ in range(count)
+    ]
+
+
+@pytest.mark.parametrize("text,expected", CORPUS)
+def test_corpus(text, expected):
+    assert _normalize_spoken_tokens(text) == expected
+    assert _legacy_normalize(text) == expected
+
+
+def test_matches_legacy_on_generated_corpus():
+    mismatches = [t for t in _generated(20000) if _normalize_spoken_tokens(t) != _legacy_normalize(t)]
+    assert mismatches == []
+
+
+def test_extract_email_from_spoken_address():
+    assert _extract_email("my email is john dot smith at gmail dot com") == "john.smith@gmail.com"
+
+
+def benchmark(repeat: int = 5, number: int = 5) -> dict:
+    """
+    Microseconds per call, old vs new, on the spoken corpus and on generated noise.
+    """
+    results = {}
+    for label, texts in (("corpus", [t for t, _ in CORPUS] * 200), ("generated", _generated(2000))):
+        for name, fn in (("legacy", _legacy_normalize), ("single_pass", _normalize_spoken_tokens)):
+            best = min(timeit.repeat(lambda: [fn(t) for t in texts], number=number, repeat=repeat))
+            results[f"{label}/{name}"] = round(best / (number * len(texts)) * 1e6, 2)
+    return results
+
+
+if __name__ == "__main__":
+    for key, us in benchmark().items():
+        print(f"{key:24} {us:8.2f} us/call")
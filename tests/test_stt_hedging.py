@@ -0,0 +1,59 @@
+# tests/test_stt_hedging.py
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("httpx")
+
+from app.utils import openai_client, whisper_stt  # noqa: E402
+
+
+@pytest.fixture
+def hedging(monkeypatch, stt_standin):
+    monkeypatch.setenv("OPENAI_BASE_URL", stt_standin.base_url)
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr(openai_client, "_clients", {})
+    monkeypatch.setattr(whisper_stt, "STT_BACKEND", "openai")
+    monkeypatch.setattr(whisper_stt, "STT_HEDGE", True)
+    monkeypatch.setattr(whisper_stt, "STT_HEDGE_MIN_S", 0.1)
+    monkeypatch.setattr(whisper_stt, "_latencies", whisper_stt.deque([0.05] * 20, maxlen=200))
+    monkeypatch.setattr(whisper_stt, "_unhedged_latencies", whisper_stt.deque([0.05] * 20, maxlen=200))
+    monkeypatch.setattr(whisper_stt, "hedge_stats", {k: type(v)() for k, v in whisper_stt.hedge_stats.items()})
+    return stt_standin
+
+
+def _transcribe_then_wait(seconds: float) -> str:
+    async def run():
+        text = await whisper_stt.transcribe_async(b"\0" * 64, filename="a.wav", content_type="audio/wav", timeout=5)
+        await asyncio.sleep(seconds)
+        return text
+
+    return asyncio.run(run())
+
+
+def test_hedge_wins_and_cancels_the_primary(hedging):
+    hedging.delays.extend([1.0, 0.05])  # slow primary, fast hedge
+    started = time.perf_counter()
+    assert _transcribe_then_wait(0) == hedging.text
+    assert time.perf_counter() - started < 0.8  # nothing waited on the primary
+
+    stats = whisper_stt.hedge_snapshot()
+    assert stats["hedged"] == 1 and stats["hedge_won"] == 1
+    # Lower bound: the primary's age at cancellation minus the hedge's own latency
+    assert stats["saved_lower_bounds"] == 1
+    assert 0.05 < stats["saved_seconds_total"] < 0.5
+    # The rescued call is left out of the p99 without hedge wins
+    assert stats["p99_without_hedge_wins_s"] < stats["p99_s"]
+
+
+def test_fast_primary_is_not_hedged(hedging, monkeypatch):
+    monkeypatch.setattr(openai_client, "connection_stats", {"requests": 0, "connections_opened": 0})
+    hedging.delays.append(0.01)
+    assert _transcribe_then_wait(0) == hedging.text
+    # The async client's trace hook ran (httpcore awaits it) and saw the new connection
+    assert openai_client.connection_snapshot()["connections_opened"] == 1
+    stats = whisper_stt.hedge_snapshot()
+    assert stats["hedged"] == 0 and stats["saved_seconds_total"] == 0
+    assert stats["p99_without_hedge_wins_s"] == stats["p99_s"]